@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.compression import existing_variants, remove_variants
+from backend.models import Floor, ResultCache, UploadedFile
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 2 * 1024**3))
+
+
+def cache_key(hasher, content_type: str, params: dict):
+    """
+    Finish the SHA-256 of an upload into the key of its conversion result.
+
+    Parameters:
+        hasher: hashlib.sha256 object that has been fed the uploaded bytes.
+        content_type (str): Content type of the upload.
+        params (dict): Pipeline parameters the upload is converted with.
+    """
+    hasher = hasher.copy()
+    hasher.update(b"\0" + content_type.encode())
+    hasher.update(b"\0" + json.dumps(params, sort_keys=True).encode())
+    return hasher.hexdigest()
+
+
+def _artifact_uuids(result: dict):
+    # Levels of detail are nested and models without geometry are None, see
+    # pipeline.convert_image
+    uuids = []
+    for value in result.values():
+        if isinstance(value, dict):
+            uuids.extend(_artifact_uuids(value))
+        elif value is not None:
+            uuids.append(uuid.UUID(value))
+    return uuids
+
+
+def lookup(db: Session, key: str, folder: str):
+    """Return the cached result for key, or None if it is unknown or incomplete."""
+    entry = db.get(ResultCache, key)
+    if entry is None:
+        return None
+    paths = [os.path.join(folder, str(u)) for u in _artifact_uuids(entry.result)]
+    if not all(os.path.exists(path) for path in paths):
+        logger.warning(f"Dropping cache entry {key} with missing files")
+        db.delete(entry)
+        db.commit()
+        return None
+    entry.last_used_at = datetime.utcnow()
+    db.commit()
+    return entry.result
+
+
+def store(db: Session, key: str, result: dict, folder: str):
+    """Add a conversion result to the cache and evict entries beyond the budget."""
+    if db.get(ResultCache, key) is not None:
+        return
+    paths = [os.path.join(folder, str(u)) for u in _artifact_uuids(result)]
+    size = sum(
+        os.path.getsize(path)
+        for path in paths + [v for path in paths for v in existing_variants(path)]
+    )
+    db.add(ResultCache(key=key, result=result, size=size))
+    db.flush()
+    evict(db, folder, keep=key)
+
+
+def evict(db: Session, folder: str, max_bytes=CACHE_MAX_BYTES, keep=None):
+    """
+    Delete the least recently used results until the cache fits max_bytes.
+
+    Results that a floor still points to, and the entry keep, are never deleted.
+    """
+    total = sum(size or 0 for (size,) in db.query(ResultCache.size))
+    if total <= max_bytes:
+        return
+    for entry in db.query(ResultCache).order_by(ResultCache.last_used_at):
+        if entry.key == keep:
+            continue
+        uuids = _artifact_uuids(entry.result)
+        in_use = (
+            db.query(Floor.uuid)
+            .filter(
+                or_(
+                    Floor.floor_png.in_(uuids),
+                    Floor.floor_3D.in_(uuids),
+                    Floor.floor_3D_walls.in_(uuids),
+                )
+            )
+            .first()
+        )
+        if in_use is not None:
+            continue
+        logger.info(f"Evicting cached result {entry.key}")
+        for file_uuid in uuids:
+            path = os.path.join(folder, str(file_uuid))
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            remove_variants(path)
+        db.query(UploadedFile).filter(UploadedFile.uuid.in_(uuids)).delete()
+        db.delete(entry)
+        total -= entry.size or 0
+        if total <= max_bytes:
+            break
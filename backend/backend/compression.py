@@ -0,0 +1,127 @@
+import gzip
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Content-Encoding to (file suffix, compress function), in order of preference
+ENCODINGS = {}
+if brotli is not None:
+    ENCODINGS["br"] = (".br", lambda data: brotli.compress(data, quality=9))
+if zstandard is not None:
+    ENCODINGS["zstd"] = (
+        ".zst",
+        lambda data: zstandard.ZstdCompressor(level=12).compress(data),
+    )
+ENCODINGS["gzip"] = (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))
+
+# Formats that are compressed already and gain nothing from another pass
+_COMPRESSED_MAGIC = (
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # JPEG
+    b"\x1f\x8b",  # gzip
+    b"PK\x03\x04",  # zip
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"RIFF",  # WebP
+)
+
+
+def variant_path(path: str, encoding: str):
+    return path + ENCODINGS[encoding][0]
+
+
+def is_compressible(path: str):
+    with open(path, "rb") as f:
+        head = f.read(4)
+    return not head.startswith(_COMPRESSED_MAGIC)
+
+
+def write_variants(path: str):
+    """
+    Write a compressed sibling of path for every available encoding.
+
+    Variants are written to a temporary name and renamed into place, so a
+    concurrent reader only ever sees complete files.
+    """
+    if not is_compressible(path):
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+    for encoding, (suffix, compress) in ENCODINGS.items():
+        target = path + suffix
+        if os.path.exists(target):
+            continue
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as out_file:
+            out_file.write(compress(data))
+        os.replace(tmp, target)
+        logger.info(f"Wrote {encoding} variant of {path}")
+
+
+def existing_variants(path: str):
+    return [
+        path + suffix
+        for suffix, _ in ENCODINGS.values()
+        if os.path.exists(path + suffix)
+    ]
+
+
+def remove_variants(path: str):
+    for suffix, _ in ENCODINGS.values():
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def parse_accept_encoding(accept_encoding: str | None):
+    """Map each coding of an Accept-Encoding header to its q-value."""
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    return weights
+
+
+def negotiate(accept_encoding: str | None, path: str):
+    """
+    Pick the encoding to serve path with.
+
+    Returns the best existing variant for the Accept-Encoding header, or None
+    for the identity encoding.
+    """
+    weights = parse_accept_encoding(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q and os.path.exists(variant_path(path, encoding)):
+            best, best_q = encoding, q
+    return best
+
+
+def missing_variants(accept_encoding: str | None, path: str):
+    """Whether the client accepts an encoding that has no variant on disk yet."""
+    weights = parse_accept_encoding(accept_encoding)
+    return any(
+        weights.get(encoding, 0.0) > 0
+        and not os.path.exists(variant_path(path, encoding))
+        for encoding in ENCODINGS
+    )
@@ -1,17 +1,46 @@
+import os
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./app.db")
+
+# Drivers of the async engine used by the API routes
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def async_database_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+
+# The sync engine is used outside of requests, by the job callbacks and
+# create_all
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL), **pool_options
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
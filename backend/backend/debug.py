@@ -0,0 +1,36 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+from PIL import Image
+
+# Intermediate rasters of every job are written below this folder when set,
+# one sub folder per job. Nothing is encoded or written otherwise.
+DEBUG_ARTIFACTS_DIR = os.environ.get("DEBUG_ARTIFACTS_DIR")
+
+# Folder of the job running in this context, None when not collecting
+_folder = ContextVar("debug_artifacts_folder", default=None)
+
+
+@contextmanager
+def artifacts(name: str, root=DEBUG_ARTIFACTS_DIR):
+    """Collect the artifacts saved inside the block in root/name, if root is set."""
+    if not root:
+        yield
+        return
+    folder = os.path.join(root, name)
+    os.makedirs(folder, exist_ok=True)
+    token = _folder.set(folder)
+    try:
+        yield
+    finally:
+        _folder.reset(token)
+
+
+def save(name: str, array: np.ndarray):
+    """Save array as name.png in the current job's artifact folder, if any."""
+    folder = _folder.get()
+    if folder is None:
+        return
+    Image.fromarray(array.astype(np.uint8)).save(os.path.join(folder, f"{name}.png"))
@@ -1,10 +1,17 @@
 import sys
-from PIL import Image
 import numpy as np
-from scipy.ndimage import convolve, label, find_objects
+from scipy.ndimage import label
 import cv2
 from matplotlib import pyplot as plt
 
+from backend import debug, metrics
+from backend.raster import (
+    UNTILED_BYTES_PER_PIXEL,
+    box_mean,
+    filter_components,
+    tiled_filter_components,
+)
+
 
 def find_largest_component(array):
     contours, _ = cv2.findContours(array, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -89,65 +96,81 @@ def floor(array):
 
 
 def wall_detector(
-    floor_plan: np.ndarray, threshold, k, area_threshold, elongation_threshold
+    floor_plan: np.ndarray,
+    threshold,
+    k,
+    area_threshold,
+    elongation_threshold,
+    box_filter="integral",
+    memory_budget=None,
 ):
-    # Convert image to numpy array
-    img_array = np.array(floor_plan).astype(np.float32)
-
-    # Create a normalized kernel of size k x k
-    kernel = np.ones((k, k), dtype=np.float32) / (k * k)
-
-    # Convolve the image with the kernel to compute the average grayness
-    avg_array = convolve(img_array, kernel, mode="reflect")
-
-    # Create the binary image based on the average grayness
-    binary_array = np.where(avg_array > threshold, 255, 0).astype(np.uint8)
-
-    # Invert the image: background should be 0, foreground (lines) should be 1
-    binary_array = 1 - binary_array // 255
-
-    # Label connected components
-    labeled_array, num_features = label(binary_array)
-
-    # Initialize an output array
-    output_array = np.zeros_like(binary_array)
-
-    # Process each connected component
-    slices = find_objects(labeled_array)
-    for i, slice_ in enumerate(slices):
-        component = labeled_array[slice_] == (i + 1)
-        area = np.sum(component)
-
-        # Compute elongation (aspect ratio)
-        rows, cols = component.nonzero()
-        if rows.size == 0 or cols.size == 0:
-            continue  # Skip empty components
-
-        height = rows.max() - rows.min() + 1
-        width = cols.max() - cols.min() + 1
-        elongation = (
-            max(height, width) / min(height, width) if min(height, width) != 0 else 0
+    if (
+        memory_budget is not None
+        and floor_plan.size * UNTILED_BYTES_PER_PIXEL > memory_budget
+    ):
+        # Same result, computed in float32 bands of rows that fit the budget
+        output_array = tiled_filter_components(
+            floor_plan,
+            k,
+            threshold,
+            area_threshold,
+            elongation_threshold,
+            memory_budget,
+            box_filter,
+            dtype=np.float32,
         )
-
-        # Check area and elongation to decide if it's a line-like structure
-        if area >= area_threshold or elongation >= elongation_threshold:
-            output_array[slice_][component] = 1  # Keep the component
-    output_array = (1 - output_array) * 255  # Invert back to original color scheme
+    else:
+        # Convert image to numpy array
+        img_array = np.array(floor_plan).astype(np.float32)
+
+        # Average grayness over a k x k window
+        with metrics.stage("box_filter"):
+            avg_array = box_mean(img_array, k, box_filter)
+
+        # Create the binary image based on the average grayness
+        binary_array = np.where(avg_array > threshold, 255, 0).astype(np.uint8)
+
+        # Invert the image: background should be 0, foreground (lines) should be 1
+        binary_array = 1 - binary_array // 255
+
+        # Label connected components
+        with metrics.stage("label"):
+            labeled_array, num_features = label(binary_array)
+        metrics.count("components", num_features)
+
+        # Keep the large and line-like components
+        with metrics.stage("filter"):
+            output_array = filter_components(
+                labeled_array, num_features, area_threshold, elongation_threshold
+            )
+    # Invert back to original color scheme, in place to avoid two more copies
+    np.subtract(1, output_array, out=output_array)
+    output_array *= 255
     return output_array
 
 
 def create_simple_floor(
-    floor_plan: np.ndarray, k, threshold, area_threshold, elongation_threshold
+    floor_plan: np.ndarray,
+    k,
+    threshold,
+    area_threshold,
+    elongation_threshold,
+    memory_budget=None,
 ):
-    output_img = Image.fromarray(floor_plan.astype(np.uint8))
-    output_img.save('orig_.png')
+    debug.save("orig", floor_plan)
     # Convert output_array back to 0 and 255
-    floor_array = wall_detector(floor_plan, 190, 5, 1500, 20)
+    floor_array = wall_detector(
+        floor_plan,
+        threshold,
+        k,
+        area_threshold,
+        elongation_threshold,
+        memory_budget=memory_budget,
+    )
     
-    filled_floor = floor(floor_array)
-    output_floor = Image.fromarray(filled_floor.astype(np.uint8))
-    output_floor.save('floor_.png')
-    # Convert the output array back to an image and save it
+    with metrics.stage("fill"):
+        filled_floor = floor(floor_array)
+    debug.save("floor", filled_floor)
     output_floor = filled_floor.astype(np.uint8)
     
     return output_floor
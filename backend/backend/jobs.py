@@ -0,0 +1,176 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from backend import debug, metrics
+from backend.db import SessionLocal
+from backend.models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", 2 * JOB_WORKERS))
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _run_job(job_id, task, fn, *args):
+    # Executed in the worker process
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.uuid == job_id).update({"status": "running"})
+        db.commit()
+    finally:
+        db.close()
+    # The metrics are sent back along with the result, see JobQueue._finish
+    with metrics.collect() as recorded, debug.artifacts(task):
+        result = fn(*args)
+    return result, recorded
+
+
+class JobQueue:
+    """
+    In-process job queue that runs conversions on a process pool.
+
+    Job state lives in the Job table so it can be polled from any request.
+    A job consists of one or more tasks that run in parallel. At most
+    max_pending tasks may be queued or running at once; submitting more raises
+    QueueFull so the caller can answer with 429. A job with more tasks than
+    that is still accepted when the queue is empty.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_QUEUE_DEPTH):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        # Job id to number of its tasks that have not finished yet
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def full(self):
+        with self._lock:
+            return sum(self._pending.values()) >= self.max_pending
+
+    def submit(self, job_id, fn, *args, on_success=None, on_finish=None):
+        """
+        Run fn(*args) in a worker process for the already created Job job_id.
+
+        on_success(db, job, result) is called in this process with an open
+        session once fn returns, before the job is committed as done, and may
+        replace job.result. on_finish()
+        is called afterwards whether the job succeeded or not.
+        """
+        self._submit(job_id, [(fn, *args)], True, on_success, on_finish)
+
+    def submit_group(self, job_id, calls, on_success=None, on_finish=None):
+        """
+        Run every (fn, *args) of calls in parallel for the Job job_id.
+
+        The job fails as soon as one call fails, calls that have not started
+        yet are cancelled then. Otherwise the job result and the results passed
+        to on_success(db, job, results) are in the order of calls, see submit.
+        """
+        self._submit(job_id, calls, False, on_success, on_finish)
+
+    def _submit(self, job_id, calls, single, on_success, on_finish):
+        with self._lock:
+            load = sum(self._pending.values())
+            if load and load + len(calls) > self.max_pending:
+                raise QueueFull()
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            # Tasks of a group keep their debug artifacts apart
+            futures = [
+                self._executor.submit(
+                    _run_job,
+                    job_id,
+                    str(job_id) if single else os.path.join(str(job_id), str(i)),
+                    fn,
+                    *args,
+                )
+                for i, (fn, *args) in enumerate(calls)
+            ]
+            self._pending[job_id] = len(futures)
+        for future in futures:
+            future.add_done_callback(
+                lambda future: self._task_done(
+                    job_id, future, futures, single, on_success, on_finish
+                )
+            )
+
+    def _task_done(self, job_id, future, futures, single, on_success, on_finish):
+        if not future.cancelled() and future.exception() is not None:
+            for other in futures:
+                other.cancel()
+        with self._lock:
+            self._pending[job_id] -= 1
+            if self._pending[job_id] > 0:
+                return
+        self._finish(job_id, futures, single, on_success, on_finish)
+
+    def _finish(self, job_id, futures, single, on_success, on_finish):
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.uuid == job_id).one()
+            try:
+                # Report the failure that cancelled the others, not a cancellation
+                for future in futures:
+                    if not future.cancelled() and future.exception() is not None:
+                        raise future.exception()
+                outputs = [future.result() for future in futures]
+                result = [output[0] for output in outputs]
+                recorded = [output[1] for output in outputs]
+                for task_metrics in recorded:
+                    metrics.observe(task_metrics)
+                if single:
+                    result, recorded = result[0], recorded[0]
+                job.status = "done"
+                job.result = result
+                job.metrics = recorded
+                if on_success is not None:
+                    on_success(db, job, result)
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e!r}")
+                db.rollback()
+                job.status = "failed"
+                job.error = repr(e)
+                if isinstance(e, BrokenProcessPool):
+                    with self._lock:
+                        self._executor = None
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+            with self._lock:
+                del self._pending[job_id]
+            if on_finish is not None:
+                on_finish()
+
+    def recover(self):
+        """Fail jobs that were left queued or running by a previous process."""
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.status.in_(["queued", "running"])).update(
+                {"status": "failed", "error": "interrupted"}
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_queue = JobQueue()
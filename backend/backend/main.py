@@ -1,14 +1,28 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 
-from backend.routes import file, floor, house, object3d
+from backend.jobs import job_queue
+from backend.routes import file, floor, house, jobs, object3d
 from backend.models import *
 from backend import models
-from .db import engine
+from .db import async_engine, engine
+from .pagination import NEXT_CURSOR_HEADER
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_queue.recover()
+    yield
+    job_queue.shutdown()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,12 +30,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(house.router)
 app.include_router(floor.router)
 app.include_router(object3d.router)
 app.include_router(file.router)
+app.include_router(jobs.router)
+
+# Conversion stage timings and sizes, see backend.metrics
+app.mount("/metrics", make_asgi_app())
 
 if __name__ == "__main__":
     models.Base.metadata.create_all(bind=engine)
@@ -0,0 +1,110 @@
+import resource
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Histogram
+
+# Recorder of the conversion running in this context, None outside of jobs
+_recorder = ContextVar("metrics_recorder", default=None)
+
+STAGE_SECONDS = Histogram(
+    "floorplan_stage_seconds",
+    "Time spent in each stage of a floor plan conversion.",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+STAGE_RSS = Histogram(
+    "floorplan_stage_rss_bytes",
+    "Resident memory of the worker at the end of each stage.",
+    ["stage"],
+    buckets=tuple(2**i * 1024**2 for i in range(5, 15)),
+)
+COUNTS = Histogram(
+    "floorplan_count",
+    "Sizes handled by a floor plan conversion, e.g. pixels or contours.",
+    ["counter"],
+    buckets=tuple(10**i for i in range(1, 10)),
+)
+
+
+def _rss():
+    """
+    Current resident memory of the process in bytes, None where unknown.
+
+    Not ru_maxrss, the high-water mark of the process lifetime, which in a
+    reused worker reflects the largest job it ever ran rather than the stage.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.prefix = ()
+        self.stages = {}
+        self.counts = {}
+
+    def as_dict(self):
+        return {"stages": self.stages, "counts": self.counts}
+
+
+@contextmanager
+def collect():
+    """
+    Record the stages and counts of the code run inside the block.
+
+    Yields a dict that is filled in once the block exits, see Recorder.as_dict.
+    """
+    recorder = Recorder()
+    token = _recorder.set(recorder)
+    metrics = {}
+    try:
+        yield metrics
+    finally:
+        _recorder.reset(token)
+        metrics.update(recorder.as_dict())
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time the block as a stage. Nested stages are named 'outer.inner' and a
+    stage entered several times accumulates its time.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    recorder.prefix += (name,)
+    key = ".".join(recorder.prefix)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.prefix = recorder.prefix[:-1]
+        entry = recorder.stages.setdefault(key, {"seconds": 0.0})
+        entry["seconds"] += time.perf_counter() - start
+        entry["rss"] = _rss()
+
+
+def count(name: str, value):
+    """Add value to the counter name of the current stage."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return
+    key = ".".join(recorder.prefix + (name,))
+    recorder.counts[key] = recorder.counts.get(key, 0) + int(value)
+
+
+def observe(metrics: dict):
+    """Export the metrics recorded by collect as Prometheus observations."""
+    for name, entry in metrics["stages"].items():
+        STAGE_SECONDS.labels(name).observe(entry["seconds"])
+        if entry["rss"] is not None:
+            STAGE_RSS.labels(name).observe(entry["rss"])
+    for name, value in metrics["counts"].items():
+        COUNTS.labels(name).observe(value)
@@ -1,5 +1,6 @@
+from datetime import datetime
 from typing import List
-from sqlalchemy import Column, Float, Integer, String
+from sqlalchemy import JSON, Column, DateTime, Float, Integer, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.orm.properties import ForeignKey
@@ -19,7 +20,7 @@ class House(Base):
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String)
     description = Column(String)
-    floors: Mapped[List["Floor"]] = relationship()
+    floors: Mapped[List["Floor"]] = relationship(lazy="selectin")
     image = Column(String)
     address = Column(String)
     longitude = Column(Float)
@@ -35,15 +36,23 @@ class Floor(Base):
     floor_3D = Column(UUID(as_uuid=True), nullable=True)
     floor_3D_walls = Column(UUID(as_uuid=True), nullable=True)
     floor_png = Column(UUID(as_uuid=True), nullable=True)
-    house_id: Mapped[UUID] = mapped_column(ForeignKey("house.uuid"), nullable=True)
-    objects: Mapped[List["Object3D"]] = relationship()
+    # Level name to file of the coarser variants of floor_3D and floor_3D_walls
+    floor_3D_lods = Column(JSON, nullable=True)
+    # Bumped on every write to the floor's objects, see spatial.floor_index
+    objects_generation = Column(Integer, nullable=False, default=0, server_default="0")
+    house_id: Mapped[UUID] = mapped_column(
+        ForeignKey("house.uuid"), nullable=True, index=True
+    )
+    objects: Mapped[List["Object3D"]] = relationship(lazy="selectin")
 
 
 class Object3D(Base):
     __tablename__ = "objects3D"
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String)
-    floor_id: Mapped[UUID] = mapped_column(ForeignKey("floor.uuid"), nullable=True)
+    floor_id: Mapped[UUID] = mapped_column(
+        ForeignKey("floor.uuid"), nullable=True, index=True
+    )
     x = Column(Float)
     y = Column(Float)
     z = Column(Float)
@@ -57,3 +66,27 @@ class UploadedFile(Base):
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     content_type = Column(String)
     data = Column(String, nullable=True)
+    # Level name to file of the coarser variants of this model
+    lods = Column(JSON, nullable=True)
+
+
+class Job(Base):
+    __tablename__ = "job"
+    uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    status = Column(String, default="queued")
+    content_type = Column(String)
+    cache_key = Column(String, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    metrics = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ResultCache(Base):
+    __tablename__ = "result_cache"
+    key = Column(String, primary_key=True)
+    result = Column(JSON)
+    size = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -1,19 +1,52 @@
+import json
 import logging
+import struct
+
 import numpy as np
 import cv2
+import shapely
 import trimesh
 from skimage import filters, measure
 from shapely.geometry import Polygon
 from trimesh.creation import extrude_polygon
 
+from backend import metrics
+
+try:
+    import meshoptimizer
+except ImportError:
+    meshoptimizer = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def image_data_to_glb(
+LAYERS = ("walls", "floor", "ceiling")
+
+# Geometry compressions of export_glb
+GLB_COMPRESSIONS = ("meshopt",)
+MESHOPT = "EXT_meshopt_compression"
+
+_JSON_CHUNK = 0x4E4F534A
+_BIN_CHUNK = 0x004E4942
+_COMPONENT_TYPES = {5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+_COMPONENTS = {"SCALAR": 1, "VEC3": 3}
+
+
+def downscale_floor(floor, size):
+    """
+    Downscale a floor mask to size, keeping the pixels it covers at least half of.
+
+    Nearest neighbour sampling breaks the thin outline the floor is traced from
+    when the raster is coarse, e.g. for PDFs rasterized below the base DPI.
+    """
+    floor = cv2.resize(floor, size, interpolation=cv2.INTER_AREA)
+    return np.where(floor >= 128, 255, 0).astype(np.uint8)
+
+
+def build_floor_meshes(
     wall_data,
     floor_ceiling_data,
-    output_filename,
     wall_height=5.0,
     floor_height=0.1,
     ceiling_height=0.1,
@@ -24,55 +57,64 @@ def image_data_to_glb(
     scaling_factor=1.0,
     scaling_method="contour",  # 'contour' or 'resize'
     contour_filter=0.0,
+    simplify_tolerance=0.0,
+    merge_collinear=False,
+    decimate_ratio=None,
+    union_walls=False,
 ):
     """
-    Extrude detected contours from image data and export as a GLB file.
+    Extrude detected contours from image data into wall, floor and ceiling meshes.
+
+    The contours are traced once and shared between the floor and the ceiling,
+    so any subset of layers can afterwards be exported with export_glb without
+    rebuilding the geometry.
 
     Parameters:
-        wall_data (np.ndarray): 2D array where non-zero pixels indicate wall boundaries.
-        floor_ceiling_data (np.ndarray): 2D array where non-zero pixels indicate floor/ceiling.
-        output_filename (str): The path for the output GLB file.
-        wall_height (float): The extrusion height for walls.
-        floor_height (float): The extrusion height for the floor.
-        ceiling_height (float): The extrusion height for the ceiling.
-        buffer_distance (float): The buffer distance for lines.
-        walls (bool): Whether to create walls.
-        floor (bool): Whether to create a floor.
-        ceiling (bool): Whether to create a ceiling.
-        scaling_factor (float): Factor to scale pixel coordinates to meters.
-        scaling_method (str): Method to apply scaling ('contour' or 'resize').
-        contour_filter (float): Minimum contour area to keep (in meters squared).
+        See image_data_to_glb.
+
+    Returns:
+        dict: Layer name ('walls', 'floor', 'ceiling') to list of trimesh.Trimesh.
     """
-    try:
-        # Apply scaling using the 'resize' method if selected
-        if scaling_method == "resize":
-            logger.info("Resizing image data using cv2")
-            # Calculate the new dimensions
-            new_size = (
-                int(wall_data.shape[1] * scaling_factor),
-                int(wall_data.shape[0] * scaling_factor),
-            )
-            # Resize wall_data and floor_ceiling_data
-            wall_data = cv2.resize(wall_data, new_size, interpolation=cv2.INTER_NEAREST)
-            floor_ceiling_data = cv2.resize(
-                floor_ceiling_data, new_size, interpolation=cv2.INTER_NEAREST
-            )
-            # Set scaling_factor to 1 since we've resized the images
-            scaling_factor = 1.0
-            wall_height *= 10
-            contour_filter *= 100
-            logger.info(f"Image data resized to {new_size}")
-        elif scaling_method != "contour":
-            logger.warning(
-                "Invalid scaling_method provided. Using default 'contour' method."
+    # Apply scaling using the 'resize' method if selected
+    if scaling_method == "resize":
+        logger.info("Resizing image data using cv2")
+        # Calculate the new dimensions
+        new_size = (
+            int(wall_data.shape[1] * scaling_factor),
+            int(wall_data.shape[0] * scaling_factor),
+        )
+        # Resize wall_data and floor_ceiling_data
+        with metrics.stage("resize"):
+            wall_data = cv2.resize(
+                wall_data, new_size, interpolation=cv2.INTER_NEAREST
             )
+            floor_ceiling_data = downscale_floor(floor_ceiling_data, new_size)
+        # Set scaling_factor to 1 since we've resized the images
+        scaling_factor = 1.0
+        wall_height *= 10
+        contour_filter *= 100
+        simplify_tolerance *= 10
+        logger.info(f"Image data resized to {new_size}")
+    elif scaling_method != "contour":
+        logger.warning(
+            "Invalid scaling_method provided. Using default 'contour' method."
+        )
 
-        meshes = []
+    # Douglas-Peucker with a zero tolerance drops just the collinear points
+    simplify = simplify_tolerance > 0 or merge_collinear
 
-        # Function to process contours and apply the contour filter
-        def process_contours(data, height, shift=0.0):
+    # Function to trace contours and apply the contour filter
+    def process_contours(data, name):
+        polygons = []
+        points_before = points_after = 0
+        with metrics.stage("contours"):
             contours = measure.find_contours(data, level=0.1)
+        metrics.count("contours", len(contours))
+        with metrics.stage("buffer"):
             for contour in contours:
+                # Too short to close a ring, typically single pixels at the border
+                if len(contour) < 4:
+                    continue
                 if scaling_method == "contour":
                     scaled_contour = contour * scaling_factor
                 else:
@@ -87,50 +129,432 @@ def image_data_to_glb(
                         )
                         continue
 
+                    points_before += len(scaled_contour)
+                    if simplify:
+                        polygon = polygon.simplify(simplify_tolerance)
+
                     # Optionally apply buffer to the polygon
                     if buffer_distance > 0:
                         polygon = polygon.buffer(buffer_distance)
-
-                    # Extrude and optionally translate the mesh
-                    mesh = extrude_polygon(polygon, height=height)
-                    if shift > 0:
-                        mesh.apply_translation(
-                            [0, 0, shift]
-                        )  # Shift mesh vertically if needed
-                    meshes.append(mesh)
+                        # Flatten the round joins the buffer adds as well
+                        if simplify:
+                            polygon = polygon.simplify(simplify_tolerance)
+                    if polygon.is_empty:
+                        continue
+                    points_after += shapely.get_num_coordinates(polygon)
+                    polygons.append(polygon)
                 else:
                     logger.warning("Invalid polygon detected, skipping")
+        if simplify:
+            logger.info(
+                f"Simplified {name} contours from {points_before} to "
+                f"{points_after} points"
+            )
+        metrics.count("points", points_after)
+        return polygons
 
-        # Process walls if enabled
-        if walls:
-            logger.info("Processing walls")
+    # Extrude and optionally translate the meshes
+    def extrude(polygons, height, shift=0.0):
+        meshes = []
+        with metrics.stage("triangulate"):
+            for polygon in polygons:
+                mesh = extrude_polygon(polygon, height=height)
+                if shift > 0:
+                    mesh.apply_translation(
+                        [0, 0, shift]
+                    )  # Shift mesh vertically if needed
+                meshes.append(mesh)
+        metrics.count("vertices", sum(len(mesh.vertices) for mesh in meshes))
+        return meshes
+
+    layers = {}
+
+    # Process walls if enabled
+    if walls:
+        logger.info("Processing walls")
+        with metrics.stage("walls"):
             edges = filters.sobel(wall_data)
-            process_contours(edges, wall_height)
+            wall_polygons = process_contours(edges, "wall")
+            if union_walls:
+                # Both sides of a wall are traced and the buffers overlap, merge
+                # them so every wall becomes one solid without coincident faces
+                with metrics.stage("union"):
+                    merged = shapely.unary_union(wall_polygons)
+                logger.info(
+                    f"Merged {len(wall_polygons)} wall polygons into "
+                    f"{shapely.get_num_geometries(merged)}"
+                )
+                wall_polygons = [
+                    polygon
+                    for polygon in getattr(merged, "geoms", [merged])
+                    if isinstance(polygon, Polygon) and not polygon.is_empty
+                ]
+            layers["walls"] = extrude(wall_polygons, wall_height)
+
+    # Floor and ceiling share the same contours
+    if floor or ceiling:
+        with metrics.stage("floor"):
+            floor_polygons = process_contours(floor_ceiling_data, "floor")
+
+    # Process floor if enabled
+    if floor:
+        logger.info("Processing floor")
+        with metrics.stage("floor"):
+            layers["floor"] = extrude(floor_polygons, floor_height)
+
+    # Process ceiling if enabled
+    if ceiling:
+        logger.info("Processing ceiling")
+        if floor and ceiling_height == floor_height:
+            # Same slab as the floor, only lifted to the top of the walls
+            layers["ceiling"] = [
+                mesh.copy().apply_translation([0, 0, wall_height])
+                for mesh in layers["floor"]
+            ]
+        else:
+            with metrics.stage("ceiling"):
+                layers["ceiling"] = extrude(
+                    floor_polygons, ceiling_height, shift=wall_height
+                )
 
-        # Process floor if enabled
-        if floor:
-            logger.info("Processing floor")
-            process_contours(floor_ceiling_data, floor_height)
+    # Optionally decimate the walls, needs the fast_simplification package.
+    # The floor and ceiling slabs are already two flat caps, decimating them
+    # only eats into the floor area.
+    if decimate_ratio is not None:
+        for name, meshes in layers.items():
+            if name != "walls" or not meshes:
+                continue
+            mesh = trimesh.util.concatenate(meshes)
+            with metrics.stage("decimate"):
+                decimated = mesh.simplify_quadric_decimation(
+                    face_count=max(4, int(len(mesh.faces) * decimate_ratio))
+                )
+            logger.info(
+                f"Decimated {name} from {len(mesh.vertices)} vertices and "
+                f"{len(mesh.faces)} faces to {len(decimated.vertices)} vertices "
+                f"and {len(decimated.faces)} faces"
+            )
+            layers[name] = [decimated]
+
+    return layers
+
+
+def mesh_stats(layers):
+    """Vertex and face counts per layer as returned by build_floor_meshes."""
+    return {
+        name: {
+            "vertices": sum(len(mesh.vertices) for mesh in meshes),
+            "faces": sum(len(mesh.faces) for mesh in meshes),
+        }
+        for name, meshes in layers.items()
+    }
 
-        # Process ceiling if enabled
-        if ceiling:
-            logger.info("Processing ceiling")
-            process_contours(floor_ceiling_data, ceiling_height, shift=wall_height)
 
-        # Combine all meshes into a single mesh
-        if meshes:
-            logger.info("Combining meshes")
-            combined_mesh = trimesh.util.concatenate(meshes)
+def export_glb(
+    layers, output_filename, include=LAYERS, compression=None, position_bits=8
+):
+    """
+    Combine the meshes of the selected layers and export them as a GLB file.
 
-            # Export the combined mesh to a GLB file
-            logger.info(f"Exporting combined mesh to: {output_filename}")
+    Parameters:
+        layers (dict): Layer meshes as returned by build_floor_meshes.
+        output_filename (str): The path for the output GLB file.
+        include (tuple): Names of the layers to export.
+        compression (str): None, or one of GLB_COMPRESSIONS. "meshopt" rounds
+            the vertex positions to position_bits fractional bits and writes
+            the geometry with write_meshopt_glb.
+        position_bits (int): Fractional bits kept of the vertex positions when
+            compressing.
+
+    Returns:
+        bool: Whether a file was written, nothing is when the layers are empty.
+    """
+    if compression is not None and compression not in GLB_COMPRESSIONS:
+        raise ValueError(f"Unknown GLB compression: {compression}")
+    meshes = [
+        mesh for name in LAYERS if name in include for mesh in layers.get(name, [])
+    ]
+
+    # Combine all meshes into a single mesh
+    if meshes:
+        logger.info("Combining meshes")
+        combined_mesh = trimesh.util.concatenate(meshes)
+
+        # Export the combined mesh to a GLB file
+        logger.info(f"Exporting combined mesh to: {output_filename}")
+        if compression == "meshopt":
+            combined_mesh = quantize_positions(combined_mesh, position_bits)
+            write_meshopt_glb(combined_mesh, output_filename)
+        else:
             combined_mesh.export(output_filename)
 
-            logger.info("Extrusion and export completed successfully")
+        logger.info("Extrusion and export completed successfully")
+        return True
+    logger.warning("No meshes were created. Check your input data and parameters.")
+    return False
+
+
+def quantize_positions(mesh, position_bits):
+    """
+    Round the vertices of mesh to multiples of 2**-position_bits.
+
+    The viewer uses the geometry without its node transform, which rules out
+    the integer positions of KHR_mesh_quantization. The positions stay float32
+    instead, the rounding leaves the low mantissa bits zero for the meshopt
+    encoder.
+    """
+    step = 2.0**-position_bits
+    vertices = np.round(mesh.vertices / step) * step
+    return trimesh.Trimesh(vertices=vertices, faces=mesh.faces, process=False)
+
+
+def _padded(data: bytes, fill: bytes):
+    return data + fill * (-len(data) % 4)
+
+
+def write_meshopt_glb(mesh, output_filename):
+    """
+    Write mesh as the node geometry_0 of a GLB with EXT_meshopt_compression.
+
+    The triangles and vertices are ordered for locality and both buffers are
+    encoded with the meshoptimizer codecs, which readers must support. The
+    indices are 16 bit when the vertex count allows it.
+    """
+    if meshoptimizer is None:
+        raise RuntimeError("meshopt compression needs the meshoptimizer package")
+    vertices = mesh.vertices.astype(np.float32)
+    indices = mesh.faces.astype(np.uint32).ravel()
+    optimized = np.empty_like(indices)
+    meshoptimizer.optimize_vertex_cache(optimized, indices, len(indices), len(vertices))
+    indices = optimized
+    fetched = np.empty_like(vertices)
+    # Remaps indices in place, unused vertices are dropped from the end
+    count = meshoptimizer.optimize_vertex_fetch(
+        fetched, indices, vertices, len(indices), len(vertices), 12
+    )
+    vertices = fetched[:count]
+    # 0xFFFF is reserved for primitive restart
+    index_size = 2 if len(vertices) < 0xFFFF else 4
+
+    encoded_indices = meshoptimizer.encode_index_buffer(
+        indices, len(indices), len(vertices)
+    )
+    # The extension only defines version 0 of the vertex codec
+    meshoptimizer.encode_vertex_version(0)
+    encoded_vertices = meshoptimizer.encode_vertex_buffer(vertices, len(vertices), 12)
+    binary = _padded(encoded_indices, b"\0") + encoded_vertices
+    # Where the decoded buffers go, in a buffer that has no data of its own
+    index_length = len(indices) * index_size
+    vertex_offset = index_length + -index_length % 4
+    views = [
+        {
+            "buffer": 1,
+            "byteOffset": 0,
+            "byteLength": index_length,
+            "target": 34963,
+            "extensions": {
+                MESHOPT: {
+                    "buffer": 0,
+                    "byteOffset": 0,
+                    "byteLength": len(encoded_indices),
+                    "byteStride": index_size,
+                    "mode": "TRIANGLES",
+                    "count": len(indices),
+                }
+            },
+        },
+        {
+            "buffer": 1,
+            "byteOffset": vertex_offset,
+            "byteLength": vertices.nbytes,
+            "byteStride": 12,
+            "target": 34962,
+            "extensions": {
+                MESHOPT: {
+                    "buffer": 0,
+                    "byteOffset": len(binary) - len(encoded_vertices),
+                    "byteLength": len(encoded_vertices),
+                    "byteStride": 12,
+                    "mode": "ATTRIBUTES",
+                    "count": len(vertices),
+                }
+            },
+        },
+    ]
+    binary = _padded(binary, b"\0")
+    gltf = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": "geometry_0", "mesh": 0}],
+        "meshes": [
+            {
+                "name": "geometry_0",
+                "primitives": [{"attributes": {"POSITION": 1}, "indices": 0}],
+            }
+        ],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5123 if index_size == 2 else 5125,
+                "count": len(indices),
+                "type": "SCALAR",
+            },
+            {
+                "bufferView": 1,
+                "componentType": 5126,
+                "count": len(vertices),
+                "type": "VEC3",
+                "min": vertices.min(axis=0).tolist(),
+                "max": vertices.max(axis=0).tolist(),
+            },
+        ],
+        "bufferViews": views,
+        "buffers": [
+            {"byteLength": len(binary)},
+            {
+                "byteLength": vertex_offset + vertices.nbytes,
+                "extensions": {MESHOPT: {"fallback": True}},
+            },
+        ],
+        "extensionsUsed": [MESHOPT],
+        "extensionsRequired": [MESHOPT],
+    }
+
+    content = _padded(json.dumps(gltf, separators=(",", ":")).encode(), b" ")
+    length = 12 + 8 + len(content) + 8 + len(binary)
+    with open(output_filename, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, length))
+        f.write(struct.pack("<II", len(content), _JSON_CHUNK) + content)
+        f.write(struct.pack("<II", len(binary), _BIN_CHUNK) + binary)
+
+
+def read_glb(path: str):
+    """Return the glTF JSON and the binary chunk of a GLB file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, _, _ = struct.unpack_from("<4sII", data)
+    if magic != b"glTF":
+        raise ValueError("not a GLB file")
+    length, chunk_type = struct.unpack_from("<II", data, 12)
+    gltf = json.loads(data[20 : 20 + length])
+    binary = b""
+    offset = 20 + length
+    if offset < len(data):
+        length, chunk_type = struct.unpack_from("<II", data, offset)
+        if chunk_type == _BIN_CHUNK:
+            binary = data[offset + 8 : offset + 8 + length]
+    return gltf, binary
+
+
+def load_glb(path: str):
+    """
+    Load the mesh of a GLB written by export_glb as a trimesh.Trimesh.
+
+    trimesh does not decode EXT_meshopt_compression, this reads the single
+    primitive written by write_meshopt_glb, or by trimesh without it.
+    """
+    gltf, binary = read_glb(path)
+    views = []
+    for view in gltf["bufferViews"]:
+        meshopt = view.get("extensions", {}).get(MESHOPT)
+        if meshopt is None:
+            start = view.get("byteOffset", 0)
+            views.append(binary[start : start + view["byteLength"]])
+            continue
+        if meshoptimizer is None:
+            raise RuntimeError("meshopt compression needs the meshoptimizer package")
+        start = meshopt.get("byteOffset", 0)
+        encoded = binary[start : start + meshopt["byteLength"]]
+        if meshopt["mode"] == "TRIANGLES":
+            # The encoding does not depend on the index size
+            decoded = meshoptimizer.decode_index_buffer(meshopt["count"], 4, encoded)
+            dtype = np.uint16 if meshopt["byteStride"] == 2 else np.uint32
+            views.append(decoded.astype(dtype).tobytes())
         else:
-            logger.warning(
-                "No meshes were created. Check your input data and parameters."
+            # Decoded into a float32 array, which keeps the bytes of any layout
+            decoded = meshoptimizer.decode_vertex_buffer(
+                meshopt["count"], meshopt["byteStride"], encoded
             )
+            views.append(decoded.tobytes())
+
+    def read(index):
+        accessor = gltf["accessors"][index]
+        count = accessor["count"] * _COMPONENTS[accessor["type"]]
+        return np.frombuffer(
+            views[accessor["bufferView"]],
+            dtype=_COMPONENT_TYPES[accessor["componentType"]],
+            count=count,
+            offset=accessor.get("byteOffset", 0),
+        )
+
+    primitive = gltf["meshes"][0]["primitives"][0]
+    vertices = read(primitive["attributes"]["POSITION"]).reshape(-1, 3)
+    faces = read(primitive["indices"]).reshape(-1, 3)
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+
+def image_data_to_glb(
+    wall_data,
+    floor_ceiling_data,
+    output_filename,
+    wall_height=5.0,
+    floor_height=0.1,
+    ceiling_height=0.1,
+    buffer_distance=0.1,
+    walls=True,
+    floor=True,
+    ceiling=True,
+    scaling_factor=1.0,
+    scaling_method="contour",  # 'contour' or 'resize'
+    contour_filter=0.0,
+    simplify_tolerance=0.0,
+    merge_collinear=False,
+    decimate_ratio=None,
+    union_walls=False,
+):
+    """
+    Extrude detected contours from image data and export as a GLB file.
+
+    Parameters:
+        wall_data (np.ndarray): 2D array where non-zero pixels indicate wall boundaries.
+        floor_ceiling_data (np.ndarray): 2D array where non-zero pixels indicate floor/ceiling.
+        output_filename (str): The path for the output GLB file.
+        wall_height (float): The extrusion height for walls.
+        floor_height (float): The extrusion height for the floor.
+        ceiling_height (float): The extrusion height for the ceiling.
+        buffer_distance (float): The buffer distance for lines.
+        walls (bool): Whether to create walls.
+        floor (bool): Whether to create a floor.
+        ceiling (bool): Whether to create a ceiling.
+        scaling_factor (float): Factor to scale pixel coordinates to meters.
+        scaling_method (str): Method to apply scaling ('contour' or 'resize').
+        contour_filter (float): Minimum contour area to keep (in meters squared).
+        simplify_tolerance (float): Douglas-Peucker contour tolerance (in meters).
+        merge_collinear (bool): Whether to drop collinear contour points.
+        decimate_ratio (float): Fraction of wall faces to keep with quadric decimation.
+        union_walls (bool): Whether to merge overlapping wall polygons before extruding.
+    """
+    try:
+        layers = build_floor_meshes(
+            wall_data,
+            floor_ceiling_data,
+            wall_height=wall_height,
+            floor_height=floor_height,
+            ceiling_height=ceiling_height,
+            buffer_distance=buffer_distance,
+            walls=walls,
+            floor=floor,
+            ceiling=ceiling,
+            scaling_factor=scaling_factor,
+            scaling_method=scaling_method,
+            contour_filter=contour_filter,
+            simplify_tolerance=simplify_tolerance,
+            merge_collinear=merge_collinear,
+            decimate_ratio=decimate_ratio,
+            union_walls=union_walls,
+        )
+        export_glb(layers, output_filename)
 
     except Exception as e:
         logger.error(f"An error occurred: {e}")
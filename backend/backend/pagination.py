@@ -0,0 +1,54 @@
+import base64
+import binascii
+import uuid
+from typing import Annotated
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Response header holding the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+MAX_PAGE_SIZE = 1000
+
+# The limit parameter of the list endpoints, requests outside it get a 422
+PageLimit = Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE, description="Rows per page")]
+
+
+def encode_cursor(key: uuid.UUID):
+    return base64.urlsafe_b64encode(key.bytes).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        return uuid.UUID(bytes=base64.urlsafe_b64decode(cursor + "=="))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(
+    db: AsyncSession, query, key, cursor: str | None, limit: int, response: Response
+):
+    """
+    Run query for one page of rows ordered by the unique column key.
+
+    Rows are looked up after the last key of the previous page instead of
+    skipped with an offset, so every page costs the same index lookup. The
+    cursor of the next page is returned in the X-Next-Cursor header.
+
+    Parameters:
+        query: Select of the mapped class that key belongs to.
+        key: Primary key column, compared as the opaque cursor.
+        cursor (str): Value of X-Next-Cursor of the previous page, None for
+            the first page.
+        limit (int): Rows per page, at least 1, see PageLimit.
+    """
+    if cursor is not None:
+        query = query.where(key > decode_cursor(cursor))
+    # One extra row tells whether there is a next page
+    result = await db.execute(query.order_by(key).limit(limit + 1))
+    rows = result.scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(rows[-1], key.key))
+    return rows
@@ -0,0 +1,306 @@
+import copy
+import math
+import os
+import uuid
+
+import cv2
+import numpy as np
+
+from backend.process import (
+    pdf_file_to_nparray,
+    pdf_page_size,
+    create_simple_floorplan,
+    array_into_png,
+    png_file_to_nparray,
+)
+from backend.numpy_to_glb import (
+    GLB_COMPRESSIONS,
+    LAYERS,
+    build_floor_meshes,
+    downscale_floor,
+    export_glb,
+)
+from backend.floor import create_simple_floor
+from backend.compression import write_variants
+from backend import metrics
+
+# Temporary memory for thresholding and labeling, larger rasters are processed
+# in bands of rows. The result does not depend on it, so it is no cache key part.
+RASTER_MEMORY_BUDGET = int(os.environ.get("RASTER_MEMORY_BUDGET", 256 * 1024 * 1024))
+
+# Resolution the pixel parameters below are tuned for, pdf2image's default
+BASE_DPI = 200
+
+# PDFs are rasterized at RASTER_DPI, or lower when the page would otherwise have
+# more than RASTER_MAX_PIXELS pixels (0 disables the limit). PNGs are assumed to
+# be at BASE_DPI.
+RASTER_DPI = int(os.environ.get("RASTER_DPI", BASE_DPI))
+RASTER_MAX_PIXELS = int(os.environ.get("RASTER_MAX_PIXELS", 0))
+
+# Geometry compression of the floor models, off by default: "meshopt" rounds
+# the positions and encodes the geometry with EXT_meshopt_compression. The
+# bundled viewer does not register a MeshoptDecoder with its glTF loader, so it
+# cannot display such models; only enable it for clients that decode them.
+GLB_COMPRESSION = os.environ.get("GLB_COMPRESSION") or None
+if GLB_COMPRESSION is not None and GLB_COMPRESSION not in GLB_COMPRESSIONS:
+    raise ValueError(f"Unknown GLB compression in GLB_COMPRESSION: {GLB_COMPRESSION}")
+
+# Coarser variants of the floor models, built from the masks downscaled by
+# raster_scale and simplified with simplify_tolerance, see build_lod_meshes
+LOD_LEVELS = {
+    "medium": {"raster_scale": 0.5, "simplify_tolerance": 0.1},
+    "coarse": {"raster_scale": 0.25, "simplify_tolerance": 0.3},
+}
+
+# Comma separated LOD_LEVELS to generate for every upload, e.g. "medium,coarse".
+# None by default, the viewer does not request them yet.
+GLB_LODS = [name for name in os.environ.get("GLB_LODS", "").split(",") if name]
+for name in GLB_LODS:
+    if name not in LOD_LEVELS:
+        raise ValueError(f"Unknown level of detail in GLB_LODS: {name}")
+
+# Everything that influences the generated artifacts, part of the cache key.
+# Bump "version" when the processing code changes its output.
+PIPELINE_PARAMS = {
+    "version": 6,
+    "raster": {
+        "dpi": RASTER_DPI,
+        "max_pixels": RASTER_MAX_PIXELS,
+    },
+    "walls": {
+        "k": 9,
+        "threshold": 190,
+        "area_threshold": 1500,
+        "elongation_threshold": 20,
+    },
+    "floor": {
+        "k": 5,
+        "threshold": 190,
+        "area_threshold": 1500,
+        "elongation_threshold": 20,
+    },
+    "mesh": {
+        "wall_height": 2.5,  # Set realistic wall height in meters
+        "floor_height": 0.25,
+        "ceiling_height": 0.25,
+        "buffer_distance": 0.1,
+        "scaling_factor": 0.07,
+        "scaling_method": "resize",
+        "contour_filter": 1.0,  # Filter out small contours
+        "simplify_tolerance": 0.02,  # Drop contour detail below 2 cm
+        "merge_collinear": False,
+        "decimate_ratio": None,
+        "union_walls": True,
+    },
+    # See GLB_LODS
+    "lods": {name: LOD_LEVELS[name] for name in GLB_LODS},
+    # See GLB_COMPRESSION, positions are kept to 2**-position_bits mesh units
+    "glb": {
+        "compression": GLB_COMPRESSION,
+        "position_bits": 8,
+    },
+    # The wall PNG is a 0/255 mask, 1 bit per pixel decodes to the same pixels
+    "png": {
+        "bilevel": True,
+        "compress_level": 6,
+        "encoder": "cv2",
+    },
+}
+
+
+# The floor models of a plan and the layers they include
+MODELS = {
+    "floor_3D": LAYERS,
+    "floor_3D_walls": ("walls", "floor"),
+}
+
+
+def scale_params(params, dpi):
+    """
+    Adapt the pixel parameters tuned at BASE_DPI to a raster of the given DPI.
+
+    Kernel sizes scale linearly and stay odd, area thresholds with the square
+    of the resolution and the metres per pixel inversely, so the generated
+    model keeps its size in metres.
+    """
+    scale = dpi / BASE_DPI
+    params = copy.deepcopy(params)
+    for step in ("walls", "floor"):
+        params[step]["k"] = max(1, round(params[step]["k"] * scale) | 1)
+        params[step]["area_threshold"] = round(
+            params[step]["area_threshold"] * scale**2
+        )
+    params["mesh"]["scaling_factor"] /= scale
+    return params
+
+
+def downscale_walls(walls, size):
+    """Downscale a wall mask to size, keeping walls thinner than its pixels."""
+    block = math.ceil(max(walls.shape[1] / size[0], walls.shape[0] / size[1]))
+    # Walls are 0, so the minimum over a block keeps any wall pixel in it
+    walls = cv2.erode(walls, np.ones((block, block), np.uint8))
+    return cv2.resize(walls, size, interpolation=cv2.INTER_NEAREST)
+
+
+def build_lod_meshes(walls, floor, mesh_params, lod):
+    """
+    Build the meshes of a level of detail, with the size of the full meshes.
+
+    The masks are traced at lod["raster_scale"] of the resolution the full
+    meshes are traced at, which drops the detail below the larger pixels, and
+    the contours are simplified with lod["simplify_tolerance"], given in the
+    units of mesh_params.
+    """
+    scale = lod["raster_scale"]
+    params = {**mesh_params, "simplify_tolerance": lod["simplify_tolerance"]}
+    resize = params["scaling_method"] == "resize"
+    factor = scale * params["scaling_factor"] if resize else scale
+    size = (
+        max(1, round(walls.shape[1] * factor)),
+        max(1, round(walls.shape[0] * factor)),
+    )
+    walls = downscale_walls(walls, size)
+    floor = downscale_floor(floor, size)
+    if not resize:
+        params["scaling_factor"] /= scale
+        return build_floor_meshes(walls, floor_ceiling_data=floor, **params)
+
+    # The masks already have their final size, and the meshes are in pixels
+    # of it, so lengths and areas shrink with the raster
+    params["scaling_factor"] = 1.0
+    params["buffer_distance"] *= scale
+    params["simplify_tolerance"] *= scale
+    params["contour_filter"] *= scale**2
+    layers = build_floor_meshes(walls, floor_ceiling_data=floor, **params)
+    # Stretch the plan back, extrusion heights are not affected
+    stretch = np.diag([1 / scale, 1 / scale, 1, 1])
+    for meshes in layers.values():
+        for mesh in meshes:
+            mesh.apply_transform(stretch)
+    return layers
+
+
+def export_model(layers, output_folder: str, glb_params, include=LAYERS):
+    """
+    Export layers as a GLB artifact with its compressed variants.
+
+    Returns the UUID of the artifact, or None when the included layers are
+    empty and there is nothing to export.
+    """
+    file_uuid = uuid.uuid4()
+    filename = os.path.join(output_folder, str(file_uuid))
+    with metrics.stage("export"):
+        written = export_glb(layers, filename + ".glb", include=include, **glb_params)
+    if not written:
+        return None
+    os.rename(filename + ".glb", filename)
+    metrics.count("bytes_written", os.path.getsize(filename))
+    with metrics.stage("compress"):
+        write_variants(filename)
+    return str(file_uuid)
+
+
+def raster_dpi(source_path: str, page: int, raster):
+    """DPI to rasterize a PDF page at, see RASTER_DPI and RASTER_MAX_PIXELS."""
+    dpi = raster["dpi"]
+    if raster["max_pixels"]:
+        width, height = pdf_page_size(source_path, page)
+        dpi = min(dpi, math.sqrt(raster["max_pixels"] / (width * height)))
+    return max(1, int(dpi))
+
+
+def convert_floor_plan(
+    source_path: str, content_type: str, output_folder: str, params=PIPELINE_PARAMS
+):
+    """
+    Convert an uploaded floor plan into the wall PNG and the two floor GLBs.
+
+    Runs inside a job worker process, so it only touches the filesystem and
+    returns the UUIDs of the artifacts it wrote to output_folder.
+
+    Parameters:
+        source_path (str): Path of the spooled upload, removed afterwards.
+        content_type (str): Content type of the upload ('application/pdf' or 'image/png').
+        output_folder (str): Folder the generated artifacts are written to.
+        params (dict): Processing parameters, see PIPELINE_PARAMS.
+    """
+    try:
+        img = 0
+        dpi = BASE_DPI
+        with metrics.stage("rasterize"):
+            if content_type == "application/pdf":
+                # Handle PDF to NumPy array conversion
+                dpi = raster_dpi(source_path, 1, params["raster"])
+                img = pdf_file_to_nparray(source_path, dpi=dpi)
+            elif content_type == "image/png":
+                # Handle PNG to NumPy array conversion
+                img = png_file_to_nparray(source_path)
+    finally:
+        os.remove(source_path)
+
+    return convert_image(img, output_folder, scale_params(params, dpi))
+
+
+def convert_pdf_page(
+    source_path: str, page: int, output_folder: str, params=PIPELINE_PARAMS
+):
+    """
+    Convert one page of a multi-page PDF like convert_floor_plan does.
+
+    The PDF is shared by the jobs of all its pages, so it is left in place.
+    Pages are numbered from 1.
+    """
+    with metrics.stage("rasterize"):
+        dpi = raster_dpi(source_path, page, params["raster"])
+        img = pdf_file_to_nparray(source_path, page, dpi)
+    return convert_image(img, output_folder, scale_params(params, dpi))
+
+
+def convert_image(img, output_folder: str, params=PIPELINE_PARAMS):
+    """
+    Run the wall, floor and GLB steps on a grayscale floor plan.
+
+    params must match the resolution of img, see scale_params.
+    """
+    metrics.count("pixels", img.size)
+
+    # Neither step modifies img, so both can read the same array
+    with metrics.stage("walls"):
+        walls = create_simple_floorplan(
+            img, **params["walls"], memory_budget=RASTER_MEMORY_BUDGET
+        )
+    with metrics.stage("floor"):
+        floor = create_simple_floor(
+            img, **params["floor"], memory_budget=RASTER_MEMORY_BUDGET
+        )
+    with metrics.stage("png"):
+        png_walls = array_into_png(walls, **params["png"])
+
+    file_uuid = uuid.uuid4()
+    filename = os.path.join(output_folder, str(file_uuid))
+    with open(filename, "wb+") as out_file:
+        out_file.write(png_walls)
+    metrics.count("bytes_written", len(png_walls))
+
+    # Build the meshes once and export both variants from them. A model whose
+    # layers are all empty has no file and is None in the result.
+    with metrics.stage("mesh"):
+        layers = build_floor_meshes(walls, floor_ceiling_data=floor, **params["mesh"])
+    result = {"floor_png": str(file_uuid)}
+    for name, include in MODELS.items():
+        result[name] = export_model(layers, output_folder, params["glb"], include)
+
+    # Level name to file of every model, e.g. lods["floor_3D"]["coarse"], empty
+    # levels are left out
+    lods = {name: {} for name in MODELS if result[name] is not None}
+    for level, lod in params["lods"].items():
+        with metrics.stage(f"lod.{level}"):
+            layers = build_lod_meshes(walls, floor, params["mesh"], lod)
+            for name in lods:
+                file_uuid = export_model(
+                    layers, output_folder, params["glb"], MODELS[name]
+                )
+                if file_uuid is not None:
+                    lods[name][level] = file_uuid
+    result["lods"] = lods
+    return result
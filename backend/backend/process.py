@@ -1,10 +1,19 @@
 import sys
+import cv2
 from PIL import Image
 import numpy as np
-from scipy.ndimage import convolve, label, find_objects
-from pdf2image import convert_from_path, convert_from_bytes
+from scipy.ndimage import label
+from pdf2image import convert_from_path, convert_from_bytes, pdfinfo_from_path
 from io import BytesIO
 
+from backend import debug, metrics
+from backend.raster import (
+    UNTILED_BYTES_PER_PIXEL,
+    box_mean,
+    filter_components,
+    tiled_filter_components,
+)
+
 
 def pdf_to_nparray(pdf: bytes):
     return np.array(convert_from_bytes(pdf)[0].convert("L"))
@@ -12,52 +21,83 @@ def pdf_to_nparray(pdf: bytes):
 def png_to_nparray(png: bytes):
     return np.array(Image.open(BytesIO(png)).convert("L"))
 
-def create_simple_floorplan(
-    img_array: np.ndarray, k, threshold, area_threshold, elongation_threshold
-):
-    # Create a normalized kernel of size k x k
-    kernel = np.ones((k, k), dtype=np.float32) / (k * k)
-
-    # Convolve the image with the kernel to compute the average grayness
-    avg_array = convolve(img_array, kernel, mode="reflect")
+def pdf_file_to_nparray(path: str, page: int = 1, dpi: int = 200):
+    # Only the requested page is rasterized, and directly in grayscale instead
+    # of going through an RGB copy
+    return np.array(
+        convert_from_path(
+            path, dpi=dpi, first_page=page, last_page=page, grayscale=True
+        )[0]
+    )
 
-    # Create the binary image based on the average grayness
-    binary_array = np.where(avg_array > threshold, 255, 0).astype(np.uint8)
+def pdf_page_count(path: str):
+    return pdfinfo_from_path(path)["Pages"]
 
-    # Invert the image: background should be 0, foreground (lines) should be 1
-    binary_array = 1 - binary_array // 255
+def pdf_page_size(path: str, page: int = 1):
+    # pdfinfo reports e.g. "612 x 792 pts (letter)", returned in inches
+    info = pdfinfo_from_path(path, first_page=page, last_page=page)
+    size = next(
+        value
+        for key, value in info.items()
+        if key.startswith("Page") and key.endswith("size")
+    )
+    width, _, height = size.split()[:3]
+    return float(width) / 72, float(height) / 72
 
-    # Label connected components
-    labeled_array, _num_features = label(binary_array)
+def png_file_to_nparray(path: str):
+    with Image.open(path) as img:
+        return np.array(img.convert("L"))
 
-    # Initialize an output array
-    output_array = np.zeros_like(binary_array)
+def create_simple_floorplan(
+    img_array: np.ndarray,
+    k,
+    threshold,
+    area_threshold,
+    elongation_threshold,
+    box_filter="integral",
+    memory_budget=None,
+):
+    if (
+        memory_budget is not None
+        and img_array.size * UNTILED_BYTES_PER_PIXEL > memory_budget
+    ):
+        # Same result, computed in bands of rows that fit the budget
+        output_array = tiled_filter_components(
+            img_array,
+            k,
+            threshold,
+            area_threshold,
+            elongation_threshold,
+            memory_budget,
+            box_filter,
+        )
+    else:
+        # Average grayness over a k x k window
+        with metrics.stage("box_filter"):
+            avg_array = box_mean(img_array, k, box_filter)
 
-    # Process each connected component
-    slices = find_objects(labeled_array)
-    for i, slice_ in enumerate(slices):
-        component = labeled_array[slice_] == (i + 1)
-        area = np.sum(component)
+        # Create the binary image based on the average grayness
+        binary_array = np.where(avg_array > threshold, 255, 0).astype(np.uint8)
 
-        # Compute elongation (aspect ratio)
-        rows, cols = component.nonzero()
-        if rows.size == 0 or cols.size == 0:
-            continue  # Skip empty components
+        # Invert the image: background should be 0, foreground (lines) should be 1
+        binary_array = 1 - binary_array // 255
 
-        height = rows.max() - rows.min() + 1
-        width = cols.max() - cols.min() + 1
-        elongation = (
-            max(height, width) / min(height, width) if min(height, width) != 0 else 0
-        )
+        # Label connected components
+        with metrics.stage("label"):
+            labeled_array, num_features = label(binary_array)
+        metrics.count("components", num_features)
 
-        # Check area and elongation to decide if it's a line-like structure
-        if area >= area_threshold or elongation >= elongation_threshold:
-            output_array[slice_][component] = 1  # Keep the component
+        # Keep the large and line-like components
+        with metrics.stage("filter"):
+            output_array = filter_components(
+                labeled_array, num_features, area_threshold, elongation_threshold
+            )
 
     # Convert output_array back to 0 and 255
-    output_array = (1 - output_array) * 255  # Invert back to original color scheme
-    output_floor = Image.fromarray(output_array.astype(np.uint8))
-    output_floor.save('walls_.png')
+    # Invert back to original color scheme, in place to avoid two more copies
+    np.subtract(1, output_array, out=output_array)
+    output_array *= 255
+    debug.save("walls", output_array)
     return output_array
 
 
@@ -115,8 +155,39 @@ def main():
     print(f"Processed image saved as {output_filename}")
 
 
-def array_into_png(array: np.ndarray):
+PNG_ENCODERS = ("pil", "cv2")
+
+def array_into_png(array: np.ndarray, bilevel=False, compress_level=6, encoder="pil"):
+    """
+    Encode a grayscale array as PNG.
+
+    Parameters:
+        array (np.ndarray): 2D array, converted to uint8.
+        bilevel (bool): Store 1 bit per pixel. Only for 0/255 masks, which
+            decode to the same pixels; anything else is thresholded at 128.
+        compress_level (int): zlib level from 0 (fastest) to 9 (smallest).
+        encoder (str): 'pil' (Pillow) or 'cv2' (OpenCV's libpng).
+    """
+    if encoder not in PNG_ENCODERS:
+        raise ValueError(f"Unknown PNG encoder {encoder!r}")
+    array = array.astype(np.uint8, copy=False)
+    if encoder == "cv2":
+        flags = [cv2.IMWRITE_PNG_COMPRESSION, compress_level]
+        if bilevel:
+            flags += [cv2.IMWRITE_PNG_BILEVEL, 1]
+        ok, encoded = cv2.imencode(".png", array, flags)
+        if not ok:
+            raise ValueError("PNG encoding failed")
+        return encoded.tobytes()
+
+    bio = BytesIO()
+    output_img = Image.fromarray(array >= 128 if bilevel else array)
+    output_img.save(bio, format="PNG", compress_level=compress_level)
+    return bio.getvalue()
+
+def array_into_webp(array: np.ndarray, method=4):
+    """Encode a grayscale array as lossless WebP, method 0 (fast) to 6 (small)."""
     bio = BytesIO()
-    output_img = Image.fromarray(array.astype(np.uint8))
-    output_img.save(bio, format="PNG")
+    output_img = Image.fromarray(array.astype(np.uint8, copy=False))
+    output_img.save(bio, format="WEBP", lossless=True, method=method)
     return bio.getvalue()
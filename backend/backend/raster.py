@@ -0,0 +1,301 @@
+import cv2
+import numpy as np
+from scipy.ndimage import convolve, find_objects, label, uniform_filter
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from backend import metrics
+
+# Number of pixels counted per np.bincount call, keeps the intp copy small
+_BINCOUNT_CHUNK = 1 << 22
+
+# Temporary bytes per pixel while thresholding and labeling an image in one go:
+# the int32 box sums, the float mean, the binary mask and the int32 labels
+UNTILED_BYTES_PER_PIXEL = 24
+
+
+def component_extents(labeled_array: np.ndarray, num_features: int):
+    """
+    Compute the bounding box of every label in one pass.
+
+    Returns:
+        tuple: (slices, heights, widths), the latter two indexed by label - 1.
+    """
+    slices = find_objects(labeled_array, max_label=num_features)
+    extents = np.array(
+        [
+            (s[0].stop - s[0].start, s[1].stop - s[1].start) if s else (0, 0)
+            for s in slices
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return slices, extents[:, 0], extents[:, 1]
+
+
+def component_areas(labeled_array: np.ndarray, num_features: int, slices, labels):
+    """
+    Count the pixels of the given labels.
+
+    Small sets of labels are counted inside their bounding boxes, otherwise a
+    single chunked np.bincount over the whole label image is cheaper.
+
+    Returns:
+        np.ndarray: Areas of labels, in the same order.
+    """
+    bbox_pixels = sum(
+        (slices[i - 1][0].stop - slices[i - 1][0].start)
+        * (slices[i - 1][1].stop - slices[i - 1][1].start)
+        for i in labels
+        if slices[i - 1]
+    )
+    if bbox_pixels < labeled_array.size:
+        return np.array(
+            [
+                np.count_nonzero(labeled_array[slices[i - 1]] == i)
+                if slices[i - 1]
+                else 0
+                for i in labels
+            ],
+            dtype=np.int64,
+        )
+
+    areas = np.zeros(num_features + 1, dtype=np.int64)
+    flat = labeled_array.reshape(-1)
+    for start in range(0, flat.size, _BINCOUNT_CHUNK):
+        areas += np.bincount(
+            flat[start : start + _BINCOUNT_CHUNK], minlength=num_features + 1
+        )
+    return areas[labels]
+
+
+def _is_line_like(heights, widths, elongation_threshold):
+    # Compute elongation (aspect ratio)
+    long_side = np.maximum(heights, widths)
+    short_side = np.minimum(heights, widths)
+    elongation = np.divide(
+        long_side,
+        short_side,
+        out=np.zeros(len(heights), dtype=np.float64),
+        where=short_side != 0,
+    )
+    return (short_side > 0) & (elongation >= elongation_threshold)
+
+
+def filter_components(
+    labeled_array: np.ndarray,
+    num_features: int,
+    area_threshold,
+    elongation_threshold,
+    dtype=np.uint8,
+):
+    """
+    Keep the components that are either large or line-like.
+
+    A component is kept when its area is at least area_threshold or the aspect
+    ratio of its bounding box is at least elongation_threshold. The area is only
+    counted for components whose bounding box could hold area_threshold pixels.
+
+    Returns:
+        np.ndarray: Array of labeled_array's shape, 1 for kept pixels and 0 elsewhere.
+    """
+    slices, heights, widths = component_extents(labeled_array, num_features)
+
+    # Check area and elongation to decide if it's a line-like structure
+    keep = _is_line_like(heights, widths, elongation_threshold)
+    undecided = np.flatnonzero(~keep & (heights * widths >= area_threshold))
+    if undecided.size:
+        areas = component_areas(labeled_array, num_features, slices, undecided + 1)
+        keep[undecided] = areas >= area_threshold
+
+    # Look up every pixel's label in a keep table, label 0 is the background
+    lut = np.zeros(num_features + 1, dtype=dtype)
+    lut[1:] = keep
+    return lut[labeled_array]
+
+
+BOX_FILTERS = ("integral", "uniform", "cv2", "convolve")
+
+
+def _box_sum(img: np.ndarray, k: int):
+    # Exact integer sums over the window [i - (k - 1) // 2, i + k // 2], the
+    # placement ndimage.convolve uses for even k as well
+    if img.dtype not in (np.uint8, np.uint16, np.int32):
+        img = img.astype(np.int32)
+    anchor = ((k - 1) // 2, (k - 1) // 2)
+    return cv2.boxFilter(
+        img,
+        cv2.CV_32S,
+        (k, k),
+        anchor=anchor,
+        normalize=False,
+        borderType=cv2.BORDER_REFLECT,
+    )
+
+
+def _is_exact_integral(img: np.ndarray, k: int):
+    # Integer pixel sums reproduce the convolution bit for bit while every
+    # window sum fits in the 24-bit float32 mantissa. Windows larger than the
+    # image reflect more than once, which is left to ndimage.
+    if img.dtype.kind not in "iuf" or img.size == 0 or k > min(img.shape):
+        return False
+    if img.dtype.kind == "f" and not np.array_equal(np.trunc(img), img):
+        return False
+    return float(np.abs(img).max()) * k * k < 2**24
+
+
+def box_mean(img: np.ndarray, k: int, backend: str = "integral"):
+    """
+    Mean over a k x k window with 'reflect' borders, like convolving with a
+    normalized k x k kernel.
+
+    Parameters:
+        img (np.ndarray): 2D image, the result has the same dtype.
+        k (int): Window size.
+        backend (str): 'integral' (exact integer window sums, bit-identical to
+            'convolve' for integer-valued images and falls back to it otherwise),
+            'uniform' (scipy.ndimage.uniform_filter), 'cv2' (cv2.blur) or
+            'convolve' (dense scipy.ndimage.convolve).
+    """
+    if backend not in BOX_FILTERS:
+        raise ValueError(f"Unknown box filter backend {backend!r}")
+    weight = np.float32(1) / np.float32(k * k)
+
+    if backend == "integral" and _is_exact_integral(img, k):
+        sums = _box_sum(img, k)
+        if img.dtype == np.float32:
+            avg_array = sums.astype(np.float32)
+            avg_array *= weight
+            return avg_array
+        avg_array = sums * np.float64(weight)
+        # For integer images the cast truncates towards zero, the same way
+        # ndimage does it
+        return avg_array.astype(img.dtype)
+
+    if backend == "uniform":
+        # uniform_filter centres even windows the other way round
+        return uniform_filter(
+            img, size=k, mode="reflect", origin=-1 if k % 2 == 0 else 0
+        )
+
+    if backend == "cv2":
+        anchor = ((k - 1) // 2, (k - 1) // 2)
+        return cv2.blur(img, (k, k), anchor=anchor, borderType=cv2.BORDER_REFLECT)
+
+    # Create a normalized kernel of size k x k
+    kernel = np.ones((k, k), dtype=np.float32) / (k * k)
+    return convolve(img, kernel, mode="reflect")
+
+
+def _band_mask(img, start, stop, k, threshold, box_filter, dtype):
+    # Foreground of rows [start, stop). The mean is taken over k extra rows of
+    # context on both sides, so reflection only happens at the image borders.
+    top = max(start - k, 0)
+    band = img[top : min(stop + k, img.shape[0])]
+    if dtype is not None:
+        band = band.astype(dtype)
+    avg_array = box_mean(band, k, box_filter)
+    return avg_array[start - top : stop - top] <= threshold
+
+
+def tiled_filter_components(
+    img: np.ndarray,
+    k,
+    threshold,
+    area_threshold,
+    elongation_threshold,
+    memory_budget,
+    box_filter="integral",
+    dtype=None,
+):
+    """
+    Threshold the box mean of img and filter its components band by band.
+
+    Gives exactly the result of box_mean, thresholding, label and
+    filter_components on the whole image, while the temporary arrays only
+    cover a band of rows that fits memory_budget bytes. Labels are merged
+    across the band seams, so areas and bounding boxes stay exact.
+
+    Parameters:
+        img (np.ndarray): 2D image, dark pixels are foreground.
+        memory_budget (int): Bytes of temporary memory per band.
+        dtype: Type each band is converted to before averaging, if any.
+
+    Returns:
+        np.ndarray: uint8 array of img's shape, 1 for kept pixels and 0 elsewhere.
+    """
+    height, width = img.shape
+    band_rows = max(memory_budget // (width * UNTILED_BYTES_PER_PIXEL) - 2 * k, k)
+    bands = [
+        (start, min(start + band_rows, height)) for start in range(0, height, band_rows)
+    ]
+
+    # First pass: mask, labels and statistics of every band. Labels are made
+    # global by offsetting them, touching labels of adjacent bands are paired.
+    mask = np.empty(img.shape, dtype=np.uint8)
+    offsets, boxes, areas, seams = [], [], [], []
+    num_features = 0
+    last_row = None
+    for start, stop in bands:
+        with metrics.stage("box_filter"):
+            mask[start:stop] = _band_mask(
+                img, start, stop, k, threshold, box_filter, dtype
+            )
+        with metrics.stage("label"):
+            labeled_band, n = label(mask[start:stop])
+        boxes.append(
+            np.array(
+                [
+                    (s[0].start + start, s[0].stop + start, s[1].start, s[1].stop)
+                    for s in find_objects(labeled_band, max_label=n)
+                ],
+                dtype=np.int64,
+            ).reshape(-1, 4)
+        )
+        areas.append(np.bincount(labeled_band.reshape(-1), minlength=n + 1)[1:])
+
+        np.add(labeled_band, num_features, out=labeled_band, where=labeled_band > 0)
+        if last_row is not None:
+            touching = (last_row > 0) & (labeled_band[0] > 0)
+            seams.append(np.stack([last_row[touching], labeled_band[0][touching]], 1))
+        last_row = labeled_band[-1].copy()
+        offsets.append(num_features)
+        num_features += n
+        del labeled_band
+    metrics.count("components", num_features)
+    if num_features == 0:
+        return mask
+
+    with metrics.stage("filter"):
+        # Merge the labels that continue across a seam into one component
+        pairs = np.concatenate(seams) - 1 if seams else np.empty((0, 2), np.int64)
+        graph = coo_matrix(
+            (np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+            shape=(num_features, num_features),
+        )
+        num_components, component = connected_components(graph, directed=False)
+
+        boxes = np.concatenate(boxes)
+        top = np.full(num_components, height, dtype=np.int64)
+        bottom = np.zeros(num_components, dtype=np.int64)
+        left = np.full(num_components, width, dtype=np.int64)
+        right = np.zeros(num_components, dtype=np.int64)
+        np.minimum.at(top, component, boxes[:, 0])
+        np.maximum.at(bottom, component, boxes[:, 1])
+        np.minimum.at(left, component, boxes[:, 2])
+        np.maximum.at(right, component, boxes[:, 3])
+        area = np.bincount(
+            component, weights=np.concatenate(areas), minlength=num_components
+        )
+
+        keep = _is_line_like(bottom - top, right - left, elongation_threshold)
+        keep |= area >= area_threshold
+        lut = np.zeros(num_features + 1, dtype=np.uint8)
+        lut[1:] = keep[component]
+
+        # Second pass: label the stored mask again, look up the global decision
+        for (start, stop), offset in zip(bands, offsets):
+            labeled_band, n = label(mask[start:stop])
+            band_lut = lut[offset : offset + n + 1].copy()
+            band_lut[0] = 0
+            mask[start:stop] = band_lut[labeled_band]
+    return mask
@@ -1,142 +1,474 @@
+import hashlib
 import uuid
 import aiofiles
 import os
-from fastapi import Depends, UploadFile, APIRouter
+from datetime import datetime
+from functools import partial
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from pdf2image.exceptions import PDFPageCountError
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, noload
 from typing import List
-import json
 
-from backend import models, schemas
+from backend import cache, compression, models, schemas
 from backend.db import get_db
-from backend.models import UploadedFile
-from backend.process import (
-    pdf_to_nparray,
-    create_simple_floorplan,
-    array_into_png,
-    png_to_nparray,
+from backend.jobs import QueueFull, job_queue
+from backend.pagination import PageLimit, paginate
+from backend.models import Job, UploadedFile
+from backend.pipeline import (
+    LOD_LEVELS,
+    PIPELINE_PARAMS,
+    convert_floor_plan,
+    convert_pdf_page,
 )
-from backend.numpy_to_glb import image_data_to_glb
-from backend.floor import create_simple_floor
+from backend.process import pdf_page_count
 
 router = APIRouter()
 
 file_folder = "files"
+incoming_folder = os.path.join(file_folder, "incoming")
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 512 * 1024**2))
+MAX_PDF_PAGES = int(os.environ.get("MAX_PDF_PAGES", 50))
+
+# Uploads convert_floor_plan can rasterize
+FLOOR_PLAN_CONTENT_TYPES = ("image/png", "application/pdf")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Files whose compressed variants are being written by a background task
+compressing = set()
+
+
+def queue_full_error():
+    return HTTPException(
+        status_code=429,
+        detail="Too many conversions in progress",
+        headers={"Retry-After": "10"},
+    )
+
+
+# The form of the upload routes, which read their body with stream_upload
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"in_file": {"type": "string", "format": "binary"}},
+                    "required": ["in_file"],
+                }
+            }
+        },
+    }
+}
+
+
+class FilePart:
+    """
+    Callbacks of a MultipartParser that pick the file named field out of the
+    multipart body and collect its data for stream_upload to write.
+    """
+
+    def __init__(self, field: str, content_types=None):
+        self.field = field.encode()
+        self.content_types = content_types
+        self.headers = {}
+        self.header_field = self.header_value = b""
+        self.writing = False
+        self.found = False
+        self.content_type = None
+        self.chunks = []
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition"))
+        if self.found or options.get(b"name") != self.field:
+            return
+        if b"filename" not in options:
+            return
+        content_type = self.headers.get(b"content-type")
+        self.content_type = content_type.decode("latin-1") if content_type else None
+        if (
+            self.content_types is not None
+            and self.content_type not in self.content_types
+        ):
+            raise HTTPException(status_code=415, detail="Unsupported file type")
+        self.writing = self.found = True
 
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.writing:
+            self.chunks.append(data[start:end])
 
-@router.post("/file/")
-async def upload_file(in_file: UploadFile, db: Session = Depends(get_db)):
+    def on_part_end(self):
+        self.writing = False
+
+
+async def stream_upload(
+    request: Request,
+    path: str,
+    field="in_file",
+    content_types=None,
+    max_bytes=MAX_UPLOAD_BYTES,
+):
+    """
+    Write the file field of a multipart request to path as the body arrives,
+    and hash it on the way.
+
+    Starlette's form parsing would receive the whole body and spool it to a
+    temporary file before the route runs. Here the body is read from the
+    request stream instead. A Content-Length above max_bytes raises 413 before
+    anything is read, otherwise 413 is raised as soon as more than max_bytes
+    have arrived. A file whose content type is not in content_types raises 415
+    once its part headers are read.
+
+    Returns:
+        The content type of the file and the hashlib.sha256 object fed with it.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise upload_too_large_error(max_bytes)
+    media_type, options = parse_options_header(request.headers.get("content-type"))
+    if media_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart form")
+
+    part = FilePart(field, content_types)
+    callbacks = {
+        name: getattr(part, name)
+        for name in (
+            "on_part_begin",
+            "on_header_field",
+            "on_header_value",
+            "on_header_end",
+            "on_headers_finished",
+            "on_part_data",
+            "on_part_end",
+        )
+    }
+    parser = MultipartParser(options[b"boundary"], callbacks)
+    hasher = hashlib.sha256()
+    size = 0
     try:
-        os.makedirs(file_folder)
-    except FileExistsError:
-        pass
+        async with aiofiles.open(path, "wb") as out_file:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise upload_too_large_error(max_bytes)
+                try:
+                    parser.write(chunk)
+                except MultipartParseError:
+                    raise HTTPException(status_code=400, detail="Malformed form")
+                for data in part.chunks:
+                    hasher.update(data)
+                    await out_file.write(data)
+                part.chunks.clear()
+        if not part.found:
+            raise HTTPException(status_code=400, detail=f"No file in field {field}")
+    except BaseException:
+        os.remove(path)
+        raise
+    return part.content_type, hasher
 
-    img_bytes = await in_file.read()
-    content_type = in_file.content_type
-    img = 0
-    if content_type == "application/pdf":
-        # Handle PDF to NumPy array conversion
-        img = pdf_to_nparray(img_bytes)
-    elif content_type == "image/png":
-        # Handle PNG to NumPy array conversion
-        img = png_to_nparray(img_bytes)
-
-    # img = pdf_to_nparray(img)
-    # img = np.array(convert_from_path("/root/code/Hackathon/junction-2024/backend/floor_1.pdf", grayscale=True)).astype(np.float32)[0]
-    img2 = img.copy()
-    walls = create_simple_floorplan(img, 9, 190, 1500, 20)
-    floor = create_simple_floor(img2, 5, 190, 1500, 20)
-    with open("/tmp/floor.png", "wb") as f:
-        f.write(array_into_png(floor))
-    png_walls = array_into_png(walls)
 
-    file_uuid = uuid.uuid4()
-    filename = os.path.join(file_folder, str(file_uuid))
-    u_file = UploadedFile(uuid=file_uuid, content_type=in_file.content_type)
-    db.add(u_file)
-    async with aiofiles.open(filename, "wb+") as out_file:
-        await out_file.write(png_walls)
+def upload_too_large_error(max_bytes):
+    return HTTPException(
+        status_code=413, detail=f"Upload is larger than {max_bytes} bytes"
+    )
 
-    file_uuid2 = uuid.uuid4()
-    filename = os.path.join(file_folder, str(file_uuid2))
-    u_file = UploadedFile(uuid=file_uuid2, content_type=in_file.content_type)
-    db.add(u_file)
-    image_data_to_glb(
-        walls,
-        floor_ceiling_data=floor,
-        output_filename=filename + ".glb",
-        wall_height=2.5,  # Set realistic wall height in meters
-        floor_height=0.25,
-        ceiling_height=0.25,
-        buffer_distance=0.1,
-        walls=True,
-        floor=True,
-        ceiling=True,
-        scaling_factor=0.07,  # Pass the scaling factor
-        scaling_method="resize",  # Choose the scaling method
-        contour_filter=1.0,  # Filter out small contours
+
+@router.post("/file/", status_code=202, openapi_extra=UPLOAD_FORM)
+async def upload_file(request: Request, db: AsyncSession = Depends(get_db)):
+    os.makedirs(incoming_folder, exist_ok=True)
+
+    job_uuid = uuid.uuid4()
+    source_path = os.path.join(incoming_folder, str(job_uuid))
+    content_type, hasher = await stream_upload(
+        request, source_path, content_types=FLOOR_PLAN_CONTENT_TYPES
     )
-    os.rename(filename + ".glb", filename)
-    db.commit()
+    # The job removes the upload once it is queued, until then it is removed
+    # here, whether the upload is answered from the cache or fails
+    queued = False
+    try:
+        key = cache.cache_key(hasher, content_type, PIPELINE_PARAMS)
 
-    file_uuid3 = uuid.uuid4()
-    filename = os.path.join(file_folder, str(file_uuid3))
-    u_file = UploadedFile(uuid=file_uuid3, content_type=in_file.content_type)
-    db.add(u_file)
-    image_data_to_glb(
-        walls,
-        floor_ceiling_data=floor,
-        output_filename=filename + ".glb",
-        wall_height=2.5,  # Set realistic wall height in meters
-        floor_height=0.25,
-        ceiling_height=0.25,
-        buffer_distance=0.1,
-        walls=True,
-        floor=True,
-        ceiling=False,
-        scaling_factor=0.07,  # Pass the scaling factor
-        scaling_method="resize",  # Choose the scaling method
-        contour_filter=1.0,  # Filter out small contours
+        # The same upload was converted before, hand out the existing artifacts
+        result = await db.run_sync(cache.lookup, key, file_folder)
+        if result is not None:
+            job = Job(
+                uuid=job_uuid,
+                status="done",
+                content_type=content_type,
+                cache_key=key,
+                result=result,
+                finished_at=datetime.utcnow(),
+            )
+            db.add(job)
+            await db.commit()
+            return {"job_id": job.uuid, "status": job.status}
+
+        if job_queue.full():
+            raise queue_full_error()
+
+        job = Job(
+            uuid=job_uuid, status="queued", content_type=content_type, cache_key=key
+        )
+        db.add(job)
+        await db.commit()
+        try:
+            job_queue.submit(
+                job.uuid,
+                convert_floor_plan,
+                source_path,
+                content_type,
+                file_folder,
+                on_success=record_artifacts,
+            )
+        except QueueFull:
+            await db.delete(job)
+            await db.commit()
+            raise queue_full_error()
+        queued = True
+    finally:
+        if not queued:
+            os.remove(source_path)
+
+    return {"job_id": job.uuid, "status": job.status}
+
+
+def record_artifacts(db: Session, job: Job, result: dict):
+    lods = result.get("lods", {})
+    for name, file_uuid in result.items():
+        # A model without geometry has no file, see convert_image
+        if name == "lods" or file_uuid is None:
+            continue
+        db.add(
+            UploadedFile(
+                uuid=uuid.UUID(file_uuid),
+                content_type=job.content_type,
+                lods=lods.get(name),
+            )
+        )
+    for levels in lods.values():
+        for file_uuid in levels.values():
+            db.add(
+                UploadedFile(uuid=uuid.UUID(file_uuid), content_type=job.content_type)
+            )
+    if job.cache_key is not None:
+        cache.store(db, job.cache_key, result, file_folder)
+
+
+@router.post(
+    "/houses/{house_id}/floors/pdf", status_code=202, openapi_extra=UPLOAD_FORM
+)
+async def upload_floors_pdf(
+    house_id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    Convert every page of a PDF into a floor of the house.
+
+    The pages are converted in parallel, one job task per page. Once all of
+    them are done the floors are created in one transaction.
+    """
+    house = await db.get(models.House, house_id, options=[noload(models.House.floors)])
+    if house is None:
+        raise HTTPException(status_code=404, detail="House not found")
+    os.makedirs(incoming_folder, exist_ok=True)
+
+    job_uuid = uuid.uuid4()
+    source_path = os.path.join(incoming_folder, str(job_uuid))
+    content_type, _ = await stream_upload(
+        request, source_path, content_types=("application/pdf",)
     )
-    os.rename(filename + ".glb", filename)
-    db.commit()
+    try:
+        pages = await run_in_threadpool(pdf_page_count, source_path)
+    except PDFPageCountError:
+        os.remove(source_path)
+        raise HTTPException(status_code=400, detail="Upload is not a valid PDF")
+    if pages > MAX_PDF_PAGES:
+        os.remove(source_path)
+        raise HTTPException(
+            status_code=400, detail=f"PDF has more than {MAX_PDF_PAGES} pages"
+        )
+
+    if job_queue.full():
+        os.remove(source_path)
+        raise queue_full_error()
+
+    job = Job(uuid=job_uuid, status="queued", content_type=content_type)
+    db.add(job)
+    await db.commit()
+    try:
+        job_queue.submit_group(
+            job.uuid,
+            [
+                (convert_pdf_page, source_path, page, file_folder)
+                for page in range(1, pages + 1)
+            ],
+            on_success=partial(record_floors, house_id),
+            on_finish=partial(os.remove, source_path),
+        )
+    except QueueFull:
+        os.remove(source_path)
+        await db.delete(job)
+        await db.commit()
+        raise queue_full_error()
+
+    return {"job_id": job.uuid, "status": job.status, "pages": pages}
 
-    return {
-        "floor_png": file_uuid,
-        "floor_3D": file_uuid2,
-        "floor_3D_walls": file_uuid3,
-    }
+
+def optional_uuid(value: str | None):
+    return None if value is None else uuid.UUID(value)
+
+
+def record_floors(house_id: uuid.UUID, db: Session, job: Job, results: list):
+    # Pages are appended after the floors the house already has
+    first_index = (
+        db.query(models.Floor).filter(models.Floor.house_id == house_id).count()
+    )
+    floor_ids = []
+    for page, result in enumerate(results):
+        record_artifacts(db, job, result)
+        index = first_index + page
+        # Same naming and default height as floors created in the frontend
+        floor = models.Floor(
+            uuid=uuid.uuid4(),
+            name=f"Floor {index + 1}",
+            height=25,
+            index=index,
+            house_id=house_id,
+            floor_png=uuid.UUID(result["floor_png"]),
+            floor_3D=optional_uuid(result["floor_3D"]),
+            floor_3D_walls=optional_uuid(result["floor_3D_walls"]),
+            floor_3D_lods=result.get("lods"),
+        )
+        db.add(floor)
+        floor_ids.append(str(floor.uuid))
+    job.result = {"floors": floor_ids, "pages": results}
+
+
+def etag_matches(if_none_match: str | None, etag: str):
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in tags
 
 
 @router.get("/file/{file_uuid}")
-async def get_file(file_uuid: uuid.UUID):
+async def get_file(
+    file_uuid: uuid.UUID,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    lod: str | None = Query(
+        None, description="Level of detail of a floor model, e.g. 'coarse'"
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    if lod is not None and lod != "full":
+        if lod not in LOD_LEVELS:
+            raise HTTPException(status_code=400, detail="Unknown level of detail")
+        db_file = await db.get(UploadedFile, file_uuid)
+        # Files without levels of detail, like the PNGs, are served in full
+        if db_file is not None and lod in (db_file.lods or {}):
+            file_uuid = uuid.UUID(db_file.lods[lod])
+
     filename = os.path.join(file_folder, str(file_uuid))
-    return FileResponse(path=filename, filename=str(file_uuid))
+    if not os.path.isfile(filename):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Serve a pre-compressed variant when the client accepts one
+    accept_encoding = request.headers.get("accept-encoding")
+    encoding = compression.negotiate(accept_encoding, filename)
 
+    # Files never change once written, so the UUID is a strong validator
+    etag = f'"{file_uuid}-{encoding}"' if encoding else f'"{file_uuid}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        path = compression.variant_path(filename, encoding)
+    else:
+        path = filename
+        # Compress once in the background, later requests get the variant
+        if (
+            compression.missing_variants(accept_encoding, filename)
+            and filename not in compressing
+            and compression.is_compressible(filename)
+        ):
+            compressing.add(filename)
+            background_tasks.add_task(write_variants, filename)
+
+    # FileResponse answers Range and If-Range requests with 206 itself
+    return FileResponse(path=path, filename=str(file_uuid), headers=headers)
 
-@router.post("/file/3d-model")
+
+def write_variants(filename: str):
+    try:
+        compression.write_variants(filename)
+    finally:
+        compressing.discard(filename)
+
+
+@router.post("/file/3d-model", openapi_extra=UPLOAD_FORM)
 async def upload_3d_model(
-    data: str, in_file: UploadFile, db: Session = Depends(get_db)
+    data: str, request: Request, db: AsyncSession = Depends(get_db)
 ):
     try:
         os.makedirs(file_folder)
     except FileExistsError:
         pass
 
-    img_bytes = await in_file.read()
-
     file_uuid = uuid.uuid4()
     filename = os.path.join(file_folder, str(file_uuid))
-    u_file = UploadedFile(uuid=file_uuid, content_type=in_file.content_type, data=data)
+    content_type, _ = await stream_upload(request, filename)
+    u_file = UploadedFile(uuid=file_uuid, content_type=content_type, data=data)
     db.add(u_file)
-    async with aiofiles.open(filename, "wb+") as out_file:
-        await out_file.write(img_bytes)
 
-    db.commit()
+    await db.commit()
 
     return file_uuid
 
 
 @router.get("/files", response_model=List[schemas.File])
-def get_files(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    return db.query(models.UploadedFile).offset(skip).limit(limit).all()
+async def get_files(
+    response: Response,
+    cursor: str | None = None,
+    limit: PageLimit = 10,
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(models.UploadedFile)
+    return await paginate(db, query, models.UploadedFile.uuid, cursor, limit, response)
@@ -1,16 +1,49 @@
+import os
 from uuid import UUID
-from fastapi import Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend import models, schemas
+from fastapi import Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload, selectinload
+from backend import models, scene, schemas, spatial
 from ..db import get_db
+from ..pagination import PageLimit, paginate
+from .file import etag_matches, file_folder
 from fastapi import APIRouter
 
 router = APIRouter()
 
+scene_folder = os.path.join(file_folder, "scenes")
+
+FLOOR_DEPTH = Query(
+    1, ge=0, le=1, description="0: floor only, 1: with the floor's objects"
+)
+
+
+def floor_loader(depth: int):
+    """Loader options of a floor query, see house.house_loader."""
+    if depth == 0:
+        return [noload(models.Floor.objects)]
+    return [selectinload(models.Floor.objects)]
+
+
+def floor_response(floor: models.Floor, depth: int):
+    """The floor as returned for depth, see house.house_response."""
+    response = schemas.Floor.model_validate(floor)
+    if depth == 0:
+        response.objects = None
+    return response
+
 
 @router.post("/floor", response_model=schemas.Floor)
-def create_floor(floor: schemas.FloorCreate, db: Session = Depends(get_db)):
-    house = db.query(models.House).filter(models.House.uuid == floor.house_id).one()
+async def create_floor(floor: schemas.FloorCreate, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(models.House)
+        .where(models.House.uuid == floor.house_id)
+        .options(noload(models.House.floors))
+    )
+    house = result.scalar_one()
     db_floor = models.Floor(
         name=floor.name,
         height=floor.height,
@@ -19,33 +52,48 @@ def create_floor(floor: schemas.FloorCreate, db: Session = Depends(get_db)):
         floor_3D=floor.floor_3D,
         floor_3D_walls=floor.floor_3D_walls,
         floor_png=floor.floor_png,
+        floor_3D_lods=floor.floor_3D_lods,
+        objects=[],
     )
     db.add(db_floor)
-    db.commit()
-    db.refresh(db_floor)
+    await db.commit()
+    await db.refresh(db_floor)
     return db_floor
 
 
 @router.get("/floors/{floor_id}", response_model=schemas.Floor)
-def read_floor(floor_id: UUID, db: Session = Depends(get_db)):
-    db_floor = db.query(models.Floor).filter(models.Floor.uuid == floor_id).first()
+async def read_floor(
+    floor_id: UUID, depth: int = FLOOR_DEPTH, db: AsyncSession = Depends(get_db)
+):
+    db_floor = await db.get(models.Floor, floor_id, options=floor_loader(depth))
     if db_floor is None:
         raise HTTPException(status_code=404, detail="Floor not found")
-    return db_floor
+    return floor_response(db_floor, depth)
 
 
 @router.delete("/floor/{floor_id}", response_model=UUID)
-def read_house(floor_id: UUID, db: Session = Depends(get_db)):
-    db.query(models.Floor).filter(models.Floor.uuid == floor_id).delete()
+async def read_house(floor_id: UUID, db: AsyncSession = Depends(get_db)):
+    await db.execute(delete(models.Floor).where(models.Floor.uuid == floor_id))
+    await db.commit()
     return UUID
 
 
 @router.put("/floor/{floor_id}")
-def update_floor(
-    floor_id: UUID, floor: schemas.FloorCreate, db: Session = Depends(get_db)
+async def update_floor(
+    floor_id: UUID, floor: schemas.FloorCreate, db: AsyncSession = Depends(get_db)
 ):
-    new_floor = db.query(models.Floor).filter(models.Floor.uuid == floor_id).one()
+    result = await db.execute(
+        select(models.Floor)
+        .where(models.Floor.uuid == floor_id)
+        .options(*floor_loader(0))
+    )
+    new_floor = result.scalar_one()
 
+    # The levels of detail belong to the models, a new model drops them
+    if floor.floor_3D_lods is not None:
+        new_floor.floor_3D_lods = floor.floor_3D_lods
+    elif floor.floor_3D != new_floor.floor_3D:
+        new_floor.floor_3D_lods = None
     if new_floor.floor_png is not None:
         new_floor.floor_png = floor.floor_png
     if new_floor.floor_3D is not None:
@@ -60,14 +108,107 @@ def update_floor(
         new_floor.index = floor.index
     try:
         db.add(new_floor)
-        db.commit()
+        await db.commit()
     except Exception as e:
         print(e)
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Failed")
     return ""
 
 
 @router.get("/floors", response_model=list[schemas.Floor])
-def read_floors(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    return db.query(models.Floor).offset(skip).limit(limit).all()
+async def read_floors(
+    response: Response,
+    cursor: str | None = None,
+    limit: PageLimit = 10,
+    depth: int = FLOOR_DEPTH,
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(models.Floor).options(*floor_loader(depth))
+    floors = await paginate(db, query, models.Floor.uuid, cursor, limit, response)
+    return [floor_response(floor, depth) for floor in floors]
+
+
+def parse_bbox(bbox: str):
+    try:
+        min_x, min_z, max_x, max_z = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="bbox must be min_x,min_z,max_x,max_z"
+        )
+    return min_x, min_z, max_x, max_z
+
+
+async def get_floor_index(db: AsyncSession, floor_id: UUID):
+    index = await spatial.floor_index(db, floor_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Floor not found")
+    return index
+
+
+@router.get("/floors/{floor_id}/objects", response_model=list[schemas.Object3D])
+async def read_floor_objects(
+    floor_id: UUID,
+    bbox: str | None = Query(
+        None, description="min_x,min_z,max_x,max_z on the floor plane"
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    """Objects of the floor, only those inside bbox if given."""
+    index = await get_floor_index(db, floor_id)
+    if bbox is None:
+        return index.objects
+    return index.within(*parse_bbox(bbox))
+
+
+@router.get("/floors/{floor_id}/objects/nearest", response_model=list[schemas.Object3D])
+async def read_nearest_objects(
+    floor_id: UUID,
+    x: float,
+    z: float,
+    k: int = Query(5, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    """The k objects of the floor closest to (x, z), closest first."""
+    index = await get_floor_index(db, floor_id)
+    return index.nearest(x, z, k)
+
+
+@router.get("/floors/{floor_id}/scene.glb")
+async def read_floor_scene(
+    floor_id: UUID, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    The floor model and the models of its objects as one glTF scene.
+
+    The scene is built on the first request after the floor's objects changed
+    and served from files/scenes otherwise.
+    """
+    db_floor = await db.get(
+        models.Floor, floor_id, options=[noload(models.Floor.objects)]
+    )
+    if db_floor is None:
+        raise HTTPException(status_code=404, detail="Floor not found")
+    floor_model = db_floor.floor_3D_walls or db_floor.floor_3D
+    floor_path = os.path.join(file_folder, str(floor_model))
+    if floor_model is None or not os.path.isfile(floor_path):
+        raise HTTPException(status_code=404, detail="Floor has no model")
+    result = await db.scalars(
+        select(models.Object3D).where(models.Object3D.floor_id == floor_id)
+    )
+    objects = result.all()
+
+    key = scene.scene_key(floor_model, objects)
+    # Revalidated on every use, the scene changes with the objects
+    headers = {"ETag": f'"{key}"', "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    path = scene.scene_path(scene_folder, floor_id, key)
+    if not os.path.isfile(path):
+        data = await run_in_threadpool(
+            scene.build_scene, floor_path, objects, file_folder
+        )
+        path = await run_in_threadpool(
+            scene.write_scene, scene_folder, floor_id, key, data
+        )
+    return FileResponse(path=path, media_type="model/gltf-binary", headers=headers)
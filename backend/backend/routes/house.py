@@ -1,17 +1,56 @@
 from uuid import UUID
-from fastapi import Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Query, Response
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload, selectinload
 from backend import models, schemas
 from ..db import get_db
+from ..pagination import PageLimit, paginate
 from fastapi import APIRouter
 
 import uuid
 
 router = APIRouter()
 
+HOUSE_DEPTH = Query(
+    2,
+    ge=0,
+    le=2,
+    description="0: house only, 1: with floors, 2: with floors and their objects",
+)
+
+
+def house_loader(depth: int):
+    """
+    Loader options of a house query returning nested data up to depth.
+
+    Every loaded level costs one extra statement, whatever the number of rows.
+    Skipped levels are left empty, house_response returns them as None.
+    """
+    if depth == 0:
+        return [noload(models.House.floors)]
+    floors = selectinload(models.House.floors)
+    if depth == 1:
+        return [floors.noload(models.Floor.objects)]
+    return [floors.selectinload(models.Floor.objects)]
+
+
+def house_response(house: models.House, depth: int):
+    """
+    The house as returned for depth, None in the levels that were not loaded
+    so that they can be told apart from levels without rows.
+    """
+    response = schemas.House.model_validate(house)
+    if depth == 0:
+        response.floors = None
+    elif depth == 1:
+        for floor in response.floors:
+            floor.objects = None
+    return response
+
 
 @router.post("/houses", response_model=schemas.House)
-def create_house(house: schemas.HouseCreate, db: Session = Depends(get_db)):
+async def create_house(house: schemas.HouseCreate, db: AsyncSession = Depends(get_db)):
     db_house = models.House(
         name=house.name,
         uuid=uuid.uuid4(),
@@ -20,26 +59,38 @@ def create_house(house: schemas.HouseCreate, db: Session = Depends(get_db)):
         address=house.address,
         longitude=house.longitude,
         latitude=house.latitude,
+        floors=[],
     )
     db.add(db_house)
-    db.commit()
-    db.refresh(db_house)
+    await db.commit()
+    await db.refresh(db_house)
     return db_house
 
 
 @router.get("/houses/{house_id}", response_model=schemas.House)
-def read_house(house_id: UUID, db: Session = Depends(get_db)):
-    db_house = db.query(models.House).filter(models.House.uuid == house_id).first()
+async def read_house(
+    house_id: UUID, depth: int = HOUSE_DEPTH, db: AsyncSession = Depends(get_db)
+):
+    db_house = await db.get(models.House, house_id, options=house_loader(depth))
     if db_house is None:
         raise HTTPException(status_code=404, detail="House not found")
-    return db_house
+    return house_response(db_house, depth)
 
 
 @router.delete("/houses/{house_id}", response_model=schemas.House)
-def delete_house(house_id: UUID, db: Session = Depends(get_db)):
-    db.query(models.House).filter(models.House.uuid == house_id).delete()
+async def delete_house(house_id: UUID, db: AsyncSession = Depends(get_db)):
+    await db.execute(delete(models.House).where(models.House.uuid == house_id))
+    await db.commit()
 
 
 @router.get("/houses", response_model=list[schemas.House])
-def read_houses(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    return db.query(models.House).offset(skip).limit(limit).all()
+async def read_houses(
+    response: Response,
+    cursor: str | None = None,
+    limit: PageLimit = 10,
+    depth: int = HOUSE_DEPTH,
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(models.House).options(*house_loader(depth))
+    houses = await paginate(db, query, models.House.uuid, cursor, limit, response)
+    return [house_response(house, depth) for house in houses]
@@ -0,0 +1,17 @@
+from uuid import UUID
+from fastapi import Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend import models, schemas
+from ..db import get_db
+from fastapi import APIRouter
+
+router = APIRouter()
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: UUID, db: AsyncSession = Depends(get_db)):
+    # Jobs are updated by the job queue, never serve a stale copy
+    db_job = await db.get(models.Job, job_id, populate_existing=True)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db_job
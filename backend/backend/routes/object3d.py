@@ -1,18 +1,46 @@
+import os
 from uuid import UUID
-from fastapi import Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend import models, schemas
+from fastapi import Body, Depends, HTTPException, Response
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload
+from backend import models, schemas, spatial
 from ..db import get_db
+from ..pagination import PageLimit, paginate
 from fastapi import APIRouter
 
 import uuid
 
 router = APIRouter()
 
+MAX_BULK_OBJECTS = int(os.environ.get("MAX_BULK_OBJECTS", 10000))
+
+
+def check_bulk_size(count: int):
+    if count > MAX_BULK_OBJECTS:
+        raise HTTPException(
+            status_code=413, detail=f"More than {MAX_BULK_OBJECTS} objects"
+        )
+
+
+async def check_floors_exist(db: AsyncSession, floor_ids: set):
+    result = await db.execute(
+        select(func.count()).where(models.Floor.uuid.in_(floor_ids))
+    )
+    if result.scalar_one() != len(floor_ids):
+        raise HTTPException(status_code=404, detail="Floor not found")
+
 
 @router.post("/object3ds", response_model=schemas.Object3D)
-def create_object3d(object3d: schemas.Object3DCreate, db: Session = Depends(get_db)):
-    floor = db.query(models.Floor).filter(models.Floor.uuid == object3d.floor_id).one()
+async def create_object3d(
+    object3d: schemas.Object3DCreate, db: AsyncSession = Depends(get_db)
+):
+    result = await db.execute(
+        select(models.Floor)
+        .where(models.Floor.uuid == object3d.floor_id)
+        .options(noload(models.Floor.objects))
+    )
+    floor = result.scalar_one()
     db_object3d = models.Object3D(
         name=object3d.name,
         uuid=uuid.uuid4(),
@@ -25,26 +53,112 @@ def create_object3d(object3d: schemas.Object3DCreate, db: Session = Depends(get_
         file_uuid=object3d.file_uuid,
     )
     db.add(db_object3d)
-    db.commit()
-    db.refresh(db_object3d)
+    await spatial.invalidate(db, floor.uuid)
+    await db.commit()
+    await db.refresh(db_object3d)
     return db_object3d
 
 
 @router.get("/object3ds/{object3d_id}", response_model=schemas.Object3D)
-def read_object3d(object3d_id: UUID, db: Session = Depends(get_db)):
-    db_object3d = (
-        db.query(models.Object3D).filter(models.Object3D.uuid == object3d_id).first()
-    )
+async def read_object3d(object3d_id: UUID, db: AsyncSession = Depends(get_db)):
+    db_object3d = await db.get(models.Object3D, object3d_id)
     if db_object3d is None:
         raise HTTPException(status_code=404, detail="Object3D not found")
     return db_object3d
 
 
 @router.delete("/object3d/{object3d_id}", response_model=schemas.House)
-def delete_object3d(object3d_id: UUID, db: Session = Depends(get_db)):
-    db.query(models.Object3D).filter(models.Object3D.uuid == object3d_id).delete()
+async def delete_object3d(object3d_id: UUID, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        delete(models.Object3D)
+        .where(models.Object3D.uuid == object3d_id)
+        .returning(models.Object3D.floor_id)
+    )
+    await spatial.invalidate(db, *result.scalars())
+    await db.commit()
 
 
 @router.get("/object3ds/", response_model=list[schemas.Object3D])
-def read_object3ds(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    return db.query(models.Object3D).offset(skip).limit(limit).all()
+async def read_object3ds(
+    response: Response,
+    cursor: str | None = None,
+    limit: PageLimit = 10,
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(models.Object3D)
+    return await paginate(db, query, models.Object3D.uuid, cursor, limit, response)
+
+
+@router.post("/object3ds/bulk", response_model=list[schemas.Object3D])
+async def create_object3ds(
+    bulk: schemas.Object3DBulkCreate, db: AsyncSession = Depends(get_db)
+):
+    """Place many objects on one floor, in one statement and transaction."""
+    check_bulk_size(len(bulk.objects))
+    await check_floors_exist(db, {bulk.floor_id})
+    if not bulk.objects:
+        return []
+    rows = [
+        {**object3d.model_dump(), "uuid": uuid.uuid4(), "floor_id": bulk.floor_id}
+        for object3d in bulk.objects
+    ]
+    result = await db.scalars(insert(models.Object3D).returning(models.Object3D), rows)
+    db_object3ds = result.all()
+    await spatial.invalidate(db, bulk.floor_id)
+    await db.commit()
+    return db_object3ds
+
+
+@router.patch("/object3ds/bulk", response_model=list[schemas.Object3D])
+async def update_object3ds(
+    updates: list[schemas.Object3DUpdate], db: AsyncSession = Depends(get_db)
+):
+    """
+    Update many objects in one transaction.
+
+    Only the fields set in an update are changed. Nothing is written when an
+    object or a target floor does not exist.
+    """
+    check_bulk_size(len(updates))
+    rows = [u.model_dump(exclude_unset=True) for u in updates]
+    object_ids = {row["uuid"] for row in rows}
+    result = await db.execute(
+        select(models.Object3D.floor_id).where(models.Object3D.uuid.in_(object_ids))
+    )
+    old_floor_ids = result.scalars().all()
+    if len(old_floor_ids) != len(object_ids):
+        raise HTTPException(status_code=404, detail="Object3D not found")
+    floor_ids = {row["floor_id"] for row in rows if row.get("floor_id") is not None}
+    if floor_ids:
+        await check_floors_exist(db, floor_ids)
+
+    # Rows are grouped by the fields they set, one executemany per group
+    changes = [row for row in rows if len(row) > 1]
+    if changes:
+        await db.execute(update(models.Object3D), changes)
+        await spatial.invalidate(db, *old_floor_ids, *floor_ids)
+        await db.commit()
+    result = await db.scalars(
+        select(models.Object3D)
+        .where(models.Object3D.uuid.in_(object_ids))
+        .execution_options(populate_existing=True)
+    )
+    # In the order of the request
+    by_id = {db_object3d.uuid: db_object3d for db_object3d in result}
+    return [by_id[object_id] for object_id in dict.fromkeys(u.uuid for u in updates)]
+
+
+@router.delete("/object3ds/bulk")
+async def delete_object3ds(
+    object3d_ids: list[UUID] = Body(), db: AsyncSession = Depends(get_db)
+):
+    check_bulk_size(len(object3d_ids))
+    result = await db.execute(
+        delete(models.Object3D)
+        .where(models.Object3D.uuid.in_(object3d_ids))
+        .returning(models.Object3D.floor_id)
+    )
+    floor_ids = result.scalars().all()
+    await spatial.invalidate(db, *floor_ids)
+    await db.commit()
+    return {"deleted": len(floor_ids)}
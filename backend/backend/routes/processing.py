@@ -1,19 +1,23 @@
 import sys
 from PIL import Image
 import numpy as np
-from scipy.ndimage import convolve, label, find_objects
+from scipy.ndimage import label
 from pdf2image import convert_from_path
 from io import BytesIO
 
+from backend.raster import box_mean, filter_components
+
 
 def create_simple_floorplan(
-    img_array: np.ndarray, k, threshold, area_threshold, elongation_threshold
+    img_array: np.ndarray,
+    k,
+    threshold,
+    area_threshold,
+    elongation_threshold,
+    box_filter="integral",
 ):
-    # Create a normalized kernel of size k x k
-    kernel = np.ones((k, k), dtype=np.float32) / (k * k)
-
-    # Convolve the image with the kernel to compute the average grayness
-    avg_array = convolve(img_array, kernel, mode="reflect")
+    # Average grayness over a k x k window
+    avg_array = box_mean(img_array, k, box_filter)
 
     # Create the binary image based on the average grayness
     binary_array = np.where(avg_array > threshold, 255, 0).astype(np.uint8)
@@ -24,29 +28,10 @@ def create_simple_floorplan(
     # Label connected components
     labeled_array, num_features = label(binary_array)
 
-    # Initialize an output array
-    output_array = np.zeros_like(binary_array)
-
-    # Process each connected component
-    slices = find_objects(labeled_array)
-    for i, slice_ in enumerate(slices):
-        component = labeled_array[slice_] == (i + 1)
-        area = np.sum(component)
-
-        # Compute elongation (aspect ratio)
-        rows, cols = component.nonzero()
-        if rows.size == 0 or cols.size == 0:
-            continue  # Skip empty components
-
-        height = rows.max() - rows.min() + 1
-        width = cols.max() - cols.min() + 1
-        elongation = (
-            max(height, width) / min(height, width) if min(height, width) != 0 else 0
-        )
-
-        # Check area and elongation to decide if it's a line-like structure
-        if area >= area_threshold or elongation >= elongation_threshold:
-            output_array[slice_][component] = 1  # Keep the component
+    # Keep the large and line-like components
+    output_array = filter_components(
+        labeled_array, num_features, area_threshold, elongation_threshold
+    )
 
     # Convert output_array back to 0 and 255
     output_array = (1 - output_array) * 255  # Invert back to original color scheme
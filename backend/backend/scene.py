@@ -0,0 +1,116 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+import numpy as np
+import trimesh
+from trimesh.transformations import rotation_matrix, translation_matrix
+
+from backend.numpy_to_glb import MESHOPT, load_glb, read_glb
+
+logger = logging.getLogger(__name__)
+
+# The viewer lays the floor model down by rotating it about X
+FLOOR_ROTATION = rotation_matrix(-np.pi / 2, [1, 0, 0])
+
+
+def scene_key(floor_model, objects):
+    """
+    Hash of everything a floor scene is built from.
+
+    Parameters:
+        floor_model (UUID): File of the floor model.
+        objects (list): Object3D rows placed on the floor.
+    """
+    placements = sorted(
+        (str(o.uuid), str(o.file_uuid), o.x, o.y, o.z, o.rotation) for o in objects
+    )
+    data = json.dumps([str(floor_model), placements])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def scene_path(folder: str, floor_id, key: str):
+    return os.path.join(folder, f"{floor_id}-{key}.glb")
+
+
+def _load(path: str):
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    file_type = "glb" if magic == b"glTF" else "gltf" if magic[:1] == b"{" else None
+    if file_type is None:
+        raise ValueError("not a glTF model")
+    if file_type == "glb":
+        required = read_glb(path)[0].get("extensionsRequired", [])
+        # Floor models compressed by export_glb, which trimesh cannot decode
+        if MESHOPT in required:
+            scene = trimesh.Scene()
+            scene.add_geometry(
+                load_glb(path), geom_name="geometry_0", node_name="geometry_0"
+            )
+            return scene
+    return trimesh.load(path, file_type=file_type, force="scene")
+
+
+def _add_instances(scene, prefix: str, model, transforms):
+    """Add the geometry of model once and one node per transform using it."""
+    for geometry_name, geometry in model.geometry.items():
+        scene.add_geometry(geometry, geom_name=f"{prefix}/{geometry_name}")
+    for node in model.graph.nodes_geometry:
+        matrix, geometry_name = model.graph[node]
+        for i, transform in enumerate(transforms):
+            scene.graph.update(
+                frame_to=f"{prefix}/{node}/{i}",
+                frame_from=scene.graph.base_frame,
+                matrix=transform @ matrix,
+                geometry=f"{prefix}/{geometry_name}",
+            )
+
+
+def build_scene(floor_path: str, objects, model_folder: str):
+    """
+    Assemble the floor model and the models of its objects into one GLB.
+
+    Every model file is stored once and instanced by one node per object
+    placed with it, moved to the object's position and rotated about Y.
+    Objects whose model is missing or not glTF are left out.
+
+    Returns:
+        The GLB as bytes.
+    """
+    scene = trimesh.Scene()
+    _add_instances(scene, "floor", _load(floor_path), [FLOOR_ROTATION])
+
+    placements = {}
+    for o in objects:
+        rotation = rotation_matrix(o.rotation, [0, 1, 0])
+        transform = translation_matrix([o.x, o.y, o.z]) @ rotation
+        placements.setdefault(o.file_uuid, []).append(transform)
+    for file_uuid, transforms in placements.items():
+        try:
+            model = _load(os.path.join(model_folder, str(file_uuid)))
+        except Exception as e:
+            logger.warning(f"Leaving model {file_uuid} out of the scene: {e}")
+            continue
+        _add_instances(scene, str(file_uuid), model, transforms)
+    return scene.export(file_type="glb")
+
+
+def write_scene(folder: str, floor_id, key: str, data: bytes):
+    """Write the scene of a floor and remove its outdated scenes."""
+    os.makedirs(folder, exist_ok=True)
+    path = scene_path(folder, floor_id, key)
+    # Requests building the same scene at once each write a file of their own
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    for old in glob.glob(os.path.join(folder, f"{floor_id}-*.glb")):
+        if old != path:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    return path
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel
 from typing import List, Optional
@@ -48,6 +49,7 @@ class FloorBase(BaseModel):
     floor_3D: Optional[UUID]
     floor_3D_walls: Optional[UUID]
     floor_png: Optional[UUID]
+    floor_3D_lods: Optional[dict[str, dict[str, str]]] = None
     house_id: Optional[UUID]
 
 
@@ -89,10 +91,41 @@ class Object3D(Object3DBase):
         from_attributes = True
 
 
+class Object3DBulkCreate(BaseModel):
+    floor_id: UUID
+    objects: List[Object3DBase]
+
+
+class Object3DUpdate(BaseModel):
+    uuid: UUID
+    name: Optional[str] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    z: Optional[float] = None
+    rotation: Optional[float] = None
+    data: Optional[str] = None
+    file_uuid: Optional[UUID] = None
+    floor_id: Optional[UUID] = None
+
+
 class File(BaseModel):
     uuid: UUID
     content_type: str
     data: str | None
+    lods: dict[str, str] | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class Job(BaseModel):
+    uuid: UUID
+    status: str
+    result: dict | None
+    error: str | None
+    metrics: dict | list | None
+    created_at: datetime
+    finished_at: datetime | None
 
     class Config:
         from_attributes = True
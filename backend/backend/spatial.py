@@ -0,0 +1,84 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend import models, schemas
+
+# Number of floor indexes kept per API process, the least recently used one is
+# dropped first
+SPATIAL_CACHE_SIZE = int(os.environ.get("SPATIAL_CACHE_SIZE", 128))
+
+# Floor UUID to (objects_generation, index) of the recently queried floors. An
+# index is only used while the floor's generation in the database matches,
+# which every process bumps when it writes the floor's objects.
+_indexes = OrderedDict()
+
+
+class FloorIndex:
+    """Objects of one floor indexed by their position on the floor plane, x/z."""
+
+    def __init__(self, objects: list[schemas.Object3D]):
+        self.objects = objects
+        # Shaped (0, 2) for a floor without objects
+        points = np.array([(o.x, o.z) for o in objects], dtype=float).reshape(-1, 2)
+        self.strtree = shapely.STRtree(shapely.points(points))
+        self.kdtree = cKDTree(points)
+
+    def within(self, min_x: float, min_z: float, max_x: float, max_z: float):
+        """Objects inside the box, including its border."""
+        indices = self.strtree.query(shapely.box(min_x, min_z, max_x, max_z))
+        return [self.objects[i] for i in np.sort(indices)]
+
+    def nearest(self, x: float, z: float, k: int):
+        """The k objects closest to (x, z), closest first."""
+        k = min(k, len(self.objects))
+        if k == 0:
+            return []
+        _, indices = self.kdtree.query((x, z), k=k)
+        return [self.objects[i] for i in np.atleast_1d(indices)]
+
+
+async def floor_index(db: AsyncSession, floor_id):
+    """Return the index of the floor, building it if needed, or None if unknown."""
+    generation = await db.scalar(
+        select(models.Floor.objects_generation).where(models.Floor.uuid == floor_id)
+    )
+    if generation is None:
+        _indexes.pop(floor_id, None)
+        return None
+    cached = _indexes.get(floor_id)
+    if cached is not None and cached[0] == generation:
+        _indexes.move_to_end(floor_id)
+        return cached[1]
+
+    # The objects are read after the generation, rows of a concurrent write
+    # at worst get stored under the generation before it and are rebuilt
+    result = await db.scalars(
+        select(models.Object3D).where(models.Object3D.floor_id == floor_id)
+    )
+    index = FloorIndex([schemas.Object3D.model_validate(o) for o in result])
+    _indexes[floor_id] = (generation, index)
+    _indexes.move_to_end(floor_id)
+    while len(_indexes) > SPATIAL_CACHE_SIZE:
+        _indexes.popitem(last=False)
+    return index
+
+
+async def invalidate(db: AsyncSession, *floor_ids):
+    """
+    Bump the generation of floors whose objects are written in the transaction
+    of db, before it is committed, so that no process uses their indexes after.
+    """
+    floor_ids = {floor_id for floor_id in floor_ids if floor_id is not None}
+    if floor_ids:
+        await db.execute(
+            update(models.Floor)
+            .where(models.Floor.uuid.in_(floor_ids))
+            .values(objects_generation=models.Floor.objects_generation + 1)
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,51 @@
+"""
+Compare the box-filter backends used for the wall-thickness averaging step.
+
+For every kernel size the thresholded mask of each backend is compared with the
+dense convolution. The 'integral' backend must match it exactly.
+
+Usage: python -m benchmarks.bench_box_filter [--size 4000x6000] [--k 3 5 9 15 25]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from backend.raster import BOX_FILTERS, box_mean
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", default="4000x6000")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 9, 15, 25])
+    parser.add_argument("--threshold", type=int, default=190)
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split("x"))
+    # Blur the plan a little so it has the anti-aliased gray levels of a render
+    plan = cv2.GaussianBlur(synthetic_floor_plan(height, width), (5, 5), 1.0)
+
+    print(f"{'dtype':>8} {'k':>3} {'backend':>9} {'time [s]':>9} {'mismatches':>11}")
+    for dtype in (np.uint8, np.float32):
+        img = plan.astype(dtype)
+        for k in args.k:
+            reference = None
+            for backend in reversed(BOX_FILTERS):
+                start = time.perf_counter()
+                mask = box_mean(img, k, backend) > args.threshold
+                elapsed = time.perf_counter() - start
+                if reference is None:
+                    reference = mask
+                mismatches = int(np.count_nonzero(mask != reference))
+                if backend == "integral":
+                    assert mismatches == 0, f"integral differs for k={k}"
+                print(
+                    f"{np.dtype(dtype).name:>8} {k:>3} {backend:>9} {elapsed:>9.3f}"
+                    f" {mismatches:>11}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare placing objects one request at a time with the bulk endpoints.
+
+Runs against the temporary SQLite database of benchmarks.database. The
+per-object path posts every object to /object3ds, the bulk path creates,
+moves and deletes all of them with one request each to /object3ds/bulk.
+
+Usage: python -m benchmarks.bench_bulk [--objects 10000]
+"""
+import argparse
+import time
+import uuid
+
+# Before anything of backend, it points DATABASE_URL to a temporary database
+from benchmarks.database import api_client, check, create_floor
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=10000)
+    args = parser.parse_args()
+
+    client = api_client()
+    floor = create_floor(client)
+    objects = [
+        {
+            "name": f"object {i}",
+            "x": i,
+            "y": 0,
+            "z": -i,
+            "rotation": 0,
+            "data": "",
+            "file_uuid": str(uuid.uuid4()),
+        }
+        for i in range(args.objects)
+    ]
+
+    _, single = timed(
+        lambda: [
+            check(client.post("/object3ds", json={**o, "floor_id": floor["uuid"]}))
+            for o in objects
+        ]
+    )
+    created, bulk = timed(
+        lambda: check(
+            client.post(
+                "/object3ds/bulk", json={"floor_id": floor["uuid"], "objects": objects}
+            )
+        )
+    )
+    assert [o["name"] for o in created] == [o["name"] for o in objects]
+
+    moves = [{"uuid": o["uuid"], "x": o["x"] + 1} for o in created]
+    moved, patch = timed(lambda: check(client.patch("/object3ds/bulk", json=moves)))
+    assert [o["x"] for o in moved] == [o["x"] + 1 for o in objects]
+
+    ids = [o["uuid"] for o in created]
+    deleted, remove = timed(
+        lambda: check(client.request("DELETE", "/object3ds/bulk", json=ids))
+    )
+    assert deleted["deleted"] == args.objects
+
+    print(f"{args.objects} objects")
+    print(f"{'one per request':>16} {single:>8.2f}s")
+    print(f"{'bulk create':>16} {bulk:>8.2f}s {single / bulk:>6.0f}x")
+    print(f"{'bulk update':>16} {patch:>8.2f}s")
+    print(f"{'bulk delete':>16} {remove:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
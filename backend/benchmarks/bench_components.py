@@ -0,0 +1,83 @@
+"""
+Compare the per-component Python loop with the vectorized component filter.
+
+Usage: python -m benchmarks.bench_components [--sizes 2000x3000 4000x6000 ...]
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.ndimage import find_objects, label
+
+from backend.raster import filter_components
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def filter_components_loop(
+    labeled_array, num_features, area_threshold, elongation_threshold
+):
+    # The original implementation, kept as the reference for the comparison
+    output_array = np.zeros(labeled_array.shape, dtype=np.uint8)
+    slices = find_objects(labeled_array)
+    for i, slice_ in enumerate(slices):
+        component = labeled_array[slice_] == (i + 1)
+        area = np.sum(component)
+
+        rows, cols = component.nonzero()
+        if rows.size == 0 or cols.size == 0:
+            continue
+
+        height = rows.max() - rows.min() + 1
+        width = cols.max() - cols.min() + 1
+        elongation = (
+            max(height, width) / min(height, width) if min(height, width) != 0 else 0
+        )
+
+        if area >= area_threshold or elongation >= elongation_threshold:
+            output_array[slice_][component] = 1
+    return output_array
+
+
+def binary_plan(height, width, speckles):
+    img = synthetic_floor_plan(height, width, speckles=speckles)
+    # Same thresholding as create_simple_floorplan, without the averaging
+    return (img <= 190).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", default=["2000x3000", "4000x6000"])
+    parser.add_argument("--speckles", type=int, default=40_000)
+    parser.add_argument("--area-threshold", type=int, default=1500)
+    parser.add_argument("--elongation-threshold", type=float, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'size':>12} {'components':>11} {'loop [s]':>9} {'vector [s]':>11}"
+        f" {'speed-up':>9}"
+    )
+    for size in args.sizes:
+        height, width = (int(v) for v in size.split("x"))
+        labeled_array, num_features = label(binary_plan(height, width, args.speckles))
+
+        start = time.perf_counter()
+        expected = filter_components_loop(
+            labeled_array, num_features, args.area_threshold, args.elongation_threshold
+        )
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = filter_components(
+            labeled_array, num_features, args.area_threshold, args.elongation_threshold
+        )
+        vector_time = time.perf_counter() - start
+
+        assert np.array_equal(expected, actual), f"outputs differ for {size}"
+        print(
+            f"{size:>12} {num_features:>11} {loop_time:>9.3f} {vector_time:>11.3f}"
+            f" {loop_time / vector_time:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Runtime of the conversion steps against the rasterization DPI.
+
+A PDF is rasterized at each DPI when one is given, which needs poppler. Otherwise
+a synthetic plan drawn at the base DPI is resampled to every DPI. The parameters
+are scaled with scale_params. Floor area and wall footprint, in model units
+squared, show how much detection degrades at low resolutions.
+
+From --min-dpi on, the floor area must stay within --tolerance of the one at the
+base DPI, which is always built first. Below it the outline of the synthetic plan
+breaks apart and its floor is only reported.
+
+Usage: python -m benchmarks.bench_dpi [--pdf plan.pdf] [--dpi 72 100 150 200 300]
+       [--min-dpi 100] [--tolerance 0.05]
+"""
+import argparse
+import time
+
+import cv2
+
+from backend.floor import create_simple_floor
+from backend.numpy_to_glb import build_floor_meshes
+from backend.pipeline import BASE_DPI, PIPELINE_PARAMS, scale_params
+from backend.process import create_simple_floorplan, pdf_file_to_nparray
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def footprint(layers, name, height):
+    # Extruded slabs are closed, so the volume is the footprint times height
+    return sum(mesh.volume for mesh in layers[name]) / height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdf", help="PDF floor plan, synthetic if omitted")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[72, 100, 150, 200, 300])
+    parser.add_argument("--page", default="11x17", help="Synthetic page in inches")
+    parser.add_argument("--min-dpi", type=int, default=100)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if not args.pdf:
+        height, width = (float(v) * BASE_DPI for v in args.page.split("x"))
+        base_plan = synthetic_floor_plan(int(height), int(width))
+
+    print(
+        f"{'dpi':>4} {'pixels':>10} {'raster [s]':>11} {'walls [s]':>10}"
+        f" {'floor [s]':>10} {'mesh [s]':>9} {'total [s]':>10}"
+        f" {'floor area':>11} {'wall area':>10} {'floor error':>12}"
+    )
+    reference = None
+    for dpi in [BASE_DPI] + [dpi for dpi in args.dpi if dpi != BASE_DPI]:
+        params = scale_params(PIPELINE_PARAMS, dpi)
+        mesh_params = params["mesh"]
+        start = time.perf_counter()
+        if args.pdf:
+            plan = pdf_file_to_nparray(args.pdf, dpi=dpi)
+        else:
+            scale = dpi / BASE_DPI
+            plan = cv2.resize(
+                base_plan, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+        times = [time.perf_counter()]
+        walls = create_simple_floorplan(plan, **params["walls"])
+        times.append(time.perf_counter())
+        floor = create_simple_floor(plan, **params["floor"])
+        times.append(time.perf_counter())
+        layers = build_floor_meshes(walls, floor_ceiling_data=floor, **mesh_params)
+        times.append(time.perf_counter())
+
+        # Heights in the units of the built meshes, see build_floor_meshes
+        unit = 10 if mesh_params["scaling_method"] == "resize" else 1
+        floor_area = footprint(layers, "floor", mesh_params["floor_height"])
+        wall_area = footprint(layers, "walls", mesh_params["wall_height"] * unit)
+        steps = [end - begin for begin, end in zip([start] + times, times)]
+        if reference is None:
+            assert floor_area, "the base DPI has no floor, try a larger page"
+            reference = floor_area
+        error = abs(floor_area - reference) / reference
+        print(
+            f"{dpi:>4} {plan.size:>10} {steps[0]:>11.3f} {steps[1]:>10.3f}"
+            f" {steps[2]:>10.3f} {steps[3]:>9.3f} {times[-1] - start:>10.3f}"
+            f" {floor_area:>11.0f} {wall_area:>10.0f} {error:>11.2%}"
+        )
+        if dpi >= args.min_dpi:
+            assert error <= args.tolerance, f"floor area drifts at {dpi} DPI"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compare the geometry compressions of export_glb with the plain export.
+
+The floor model of a synthetic plan is exported with every compression and
+read back, the plain file with trimesh and the meshopt file with load_glb.
+Every decoded vertex must be within half the position step of the full
+precision mesh, with the same triangles and winding, and the decoded mesh must
+keep the volume. The transfer size with the served encodings is reported as
+well. Plans too small to have any geometry fail.
+
+Usage:
+    python -m benchmarks.bench_glb [--size 3000x4000] [--rooms 4x6]
+        [--wall-thickness 16] [--position-bits 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+from scipy.spatial import cKDTree
+
+from backend.compression import ENCODINGS
+from backend.floor import create_simple_floor
+from backend.numpy_to_glb import (
+    GLB_COMPRESSIONS,
+    LAYERS,
+    build_floor_meshes,
+    export_glb,
+    load_glb,
+)
+from backend.pipeline import PIPELINE_PARAMS
+from backend.process import create_simple_floorplan
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def faces_by_position(faces, ids):
+    """Triangles as vertex position ids, rotated to start at the lowest id."""
+    faces = ids[faces]
+    rolled = np.array([np.roll(f, -np.argmin(f)) for f in faces]).reshape(-1, 3)
+    return rolled[np.lexsort(rolled.T[::-1])]
+
+
+def compare(decoded, reference):
+    """
+    Largest distance of a decoded vertex to the reference, and whether the
+    decoded triangles, with their winding, are those of the reference.
+    """
+    positions, ids = np.unique(reference.vertices, axis=0, return_inverse=True)
+    distances, nearest = cKDTree(positions).query(decoded.vertices)
+    same = np.array_equal(
+        faces_by_position(decoded.faces, nearest),
+        faces_by_position(reference.faces, ids.ravel()),
+    )
+    return distances.max(), same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", default="3000x4000")
+    parser.add_argument("--rooms", default="4x6")
+    parser.add_argument("--wall-thickness", type=int, default=16)
+    parser.add_argument("--position-bits", type=int, default=8)
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split("x"))
+    rooms = tuple(int(v) for v in args.rooms.split("x"))
+    plan = synthetic_floor_plan(
+        height, width, rooms=rooms, wall_thickness=args.wall_thickness
+    )
+    walls = create_simple_floorplan(plan.copy(), **PIPELINE_PARAMS["walls"])
+    floor = create_simple_floor(plan.copy(), **PIPELINE_PARAMS["floor"])
+    layers = build_floor_meshes(
+        walls, floor_ceiling_data=floor, **PIPELINE_PARAMS["mesh"]
+    )
+    meshes = [m for name in LAYERS for m in layers[name] if not m.is_empty]
+    assert meshes, "every layer of the plan is empty, try a larger plan"
+    reference = trimesh.util.concatenate(meshes)
+    tolerance = 2.0**-args.position_bits / 2
+
+    print(
+        f"{'compression':>12} {'time [s]':>9} {'bytes':>9}"
+        + "".join(f" {encoding:>9}" for encoding in ENCODINGS)
+        + f" {'max error':>10}"
+    )
+    with tempfile.TemporaryDirectory() as folder:
+        for compression in (None, *GLB_COMPRESSIONS):
+            path = os.path.join(folder, f"{compression}.glb")
+            start = time.perf_counter()
+            written = export_glb(
+                layers,
+                path,
+                compression=compression,
+                position_bits=args.position_bits,
+            )
+            elapsed = time.perf_counter() - start
+            assert written, f"{compression} wrote no file"
+            with open(path, "rb") as f:
+                data = f.read()
+
+            if compression == "meshopt":
+                decoded = load_glb(path)
+            else:
+                decoded = trimesh.load(path, force="mesh", process=False)
+            error, same = compare(decoded, reference)
+            assert same, f"{compression} changes the triangles"
+            # Half the step per axis, plus float32 rounding
+            assert error <= tolerance * 3**0.5 + 1e-4, f"{compression} moves vertices"
+            assert np.isclose(decoded.volume, reference.volume, rtol=1e-3)
+
+            print(
+                f"{str(compression):>12} {elapsed:>9.3f} {len(data):>9}"
+                + "".join(
+                    f" {len(compress(data)):>9}" for _, compress in ENCODINGS.values()
+                )
+                + f" {error:>10.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
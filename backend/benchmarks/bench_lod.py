@@ -0,0 +1,105 @@
+"""
+Compare the levels of detail of the floor model with the full model.
+
+Every level in LOD_LEVELS is built from the same synthetic plan as the full
+meshes and exported as a GLB, whether GLB_LODS enables it or not. The floor
+area must stay within --tolerance of the full model and the floor bounds
+within three pixels of the level's raster, so that a coarse model can stand in
+for the full one. Walls thinner than a pixel of the level are kept a pixel
+thick, so the wall footprint grows with the level and is only reported. The
+full model must have both floor and walls; plans too small for them fail.
+
+Usage:
+    python -m benchmarks.bench_lod [--size 3000x4000] [--rooms 4x6]
+        [--wall-thickness 16] [--tolerance 0.05]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+from backend.floor import create_simple_floor
+from backend.numpy_to_glb import build_floor_meshes, export_glb, mesh_stats
+from backend.pipeline import LOD_LEVELS, PIPELINE_PARAMS, build_lod_meshes
+from backend.process import create_simple_floorplan
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def merged(meshes):
+    """The meshes of a layer as one mesh, None for an empty layer."""
+    meshes = [mesh for mesh in meshes if not mesh.is_empty]
+    return trimesh.util.concatenate(meshes) if meshes else None
+
+
+def footprint(meshes):
+    mesh = merged(meshes)
+    if mesh is None:
+        return 0.0
+    # Extruded slabs are closed, so the volume is the footprint times height
+    return mesh.volume / np.ptp(mesh.bounds[:, 2])
+
+
+def glb_size(layers):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "model.glb")
+        # Nothing is written when every layer is empty
+        return os.path.getsize(path) if export_glb(layers, path) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", default="3000x4000")
+    parser.add_argument("--rooms", default="4x6")
+    parser.add_argument("--wall-thickness", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split("x"))
+    rooms = tuple(int(v) for v in args.rooms.split("x"))
+    plan = synthetic_floor_plan(
+        height, width, rooms=rooms, wall_thickness=args.wall_thickness
+    )
+    walls = create_simple_floorplan(plan.copy(), **PIPELINE_PARAMS["walls"])
+    floor = create_simple_floor(plan.copy(), **PIPELINE_PARAMS["floor"])
+    mesh_params = PIPELINE_PARAMS["mesh"]
+    # Size of a pixel of the traced raster in the units of the built meshes
+    pixel = 1 if mesh_params["scaling_method"] == "resize" else 1 / 0.07
+
+    levels = {"full": None, **LOD_LEVELS}
+    print(
+        f"{'level':>8} {'time [s]':>9} {'faces':>8} {'bytes':>9}"
+        f" {'floor area':>11} {'wall area':>10} {'bounds':>7}"
+    )
+    reference = None
+    for level, lod in levels.items():
+        start = time.perf_counter()
+        if lod is None:
+            layers = build_floor_meshes(walls, floor_ceiling_data=floor, **mesh_params)
+        else:
+            layers = build_lod_meshes(walls, floor, mesh_params, lod)
+        elapsed = time.perf_counter() - start
+
+        faces = sum(s["faces"] for s in mesh_stats(layers).values())
+        areas = [footprint(layers[name]) for name in ("floor", "walls")]
+        floor_mesh = merged(layers["floor"])
+        bounds = None if floor_mesh is None else floor_mesh.bounds
+        if reference is None:
+            assert all(areas), "the full model has no floor or walls, try a larger plan"
+            reference = areas, bounds
+        errors = [abs(a - r) / r for a, r in zip(areas, reference[0])]
+        assert bounds is not None, f"{level} lost the floor"
+        shift = np.abs(bounds - reference[1])[:, :2].max()
+        print(
+            f"{level:>8} {elapsed:>9.3f} {faces:>8} {glb_size(layers):>9}"
+            f" {errors[0]:>10.2%} {errors[1]:>9.2%} {shift:>7.2f}"
+        )
+        assert errors[0] <= args.tolerance, f"floor area drifts for {level}"
+        if lod is not None:
+            assert shift <= 3 * pixel / lod["raster_scale"], f"{level} is shifted"
+
+
+if __name__ == "__main__":
+    main()
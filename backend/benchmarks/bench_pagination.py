@@ -0,0 +1,103 @@
+"""
+Compare offset and cursor pagination of the object listing on a large table.
+
+Seeds the temporary SQLite database of benchmarks.database with --objects
+objects spread over --floors floors, then times fetching one page at increasing
+depths with offset/limit and with a keyset cursor, and loading the objects of
+one floor with and without the floor_id index. The first pages are also walked through /object3ds/ and
+checked against the offset pages.
+
+Usage: python -m benchmarks.bench_pagination [--objects 1000000] [--limit 100]
+"""
+import argparse
+import time
+import uuid
+
+# Before anything of backend, it points DATABASE_URL to a temporary database
+from benchmarks.database import api_client, seed
+
+from sqlalchemy import select, text
+
+from backend import models
+from backend.db import SessionLocal
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def compare_pages(db, objects, limit, repeat):
+    key = models.Object3D.uuid
+    print(f"{'depth':>9} {'offset [s]':>11} {'cursor [s]':>11}")
+    for depth in (objects // 100, objects // 10, objects // 2, objects - limit):
+        by_offset, offset_time = best_of(
+            lambda: db.scalars(
+                select(key).order_by(key).offset(depth).limit(limit)
+            ).all(),
+            repeat,
+        )
+        # The cursor is the last key of the previous page
+        last = db.scalar(select(key).order_by(key).offset(depth - 1))
+        by_cursor, cursor_time = best_of(
+            lambda: db.scalars(
+                select(key).where(key > last).order_by(key).limit(limit)
+            ).all(),
+            repeat,
+        )
+        assert by_offset == by_cursor
+        print(f"{depth:>9} {offset_time:>11.4f} {cursor_time:>11.4f}")
+
+
+def compare_index(db, floor_id, repeat):
+    query = select(models.Object3D).where(models.Object3D.floor_id == floor_id)
+    _, indexed = best_of(lambda: db.scalars(query).all(), repeat)
+    db.execute(text('DROP INDEX "ix_objects3D_floor_id"'))
+    db.expunge_all()
+    rows, scanned = best_of(lambda: db.scalars(query).all(), repeat)
+    db.execute(text('CREATE INDEX "ix_objects3D_floor_id" ON "objects3D" (floor_id)'))
+    print(f"\nobjects of one floor ({len(rows)} rows)")
+    print(f"{'index [s]':>11} {'scan [s]':>11}\n{indexed:>11.4f} {scanned:>11.4f}")
+
+
+def walk_api(db, limit, pages):
+    client = api_client()
+    key = models.Object3D.uuid
+    cursor = None
+    for page in range(pages):
+        params = {"limit": limit} | ({"cursor": cursor} if cursor else {})
+        response = client.get("/object3ds/", params=params)
+        response.raise_for_status()
+        expected = db.scalars(
+            select(key).order_by(key).offset(page * limit).limit(limit)
+        ).all()
+        assert [uuid.UUID(o["uuid"]) for o in response.json()] == expected
+        cursor = response.headers["X-Next-Cursor"]
+    print(f"\n/object3ds/ returned the same {pages} pages as offset/limit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=1_000_000)
+    parser.add_argument("--floors", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    _, floor_ids = seed(1, args.floors, args.objects // args.floors)
+    objects = len(floor_ids) * (args.objects // args.floors)
+    print(f"Seeded {objects} objects in {time.perf_counter() - start:.1f}s\n")
+
+    with SessionLocal() as db:
+        compare_pages(db, objects, args.limit, args.repeat)
+        compare_index(db, floor_ids[0], args.repeat)
+        walk_api(db, args.limit, pages=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the encoders for the wall masks stored as floor PNGs.
+
+Every encoder is run on the wall mask of a synthetic plan and has to decode back
+to the same pixels.
+
+Usage: python -m benchmarks.bench_png [--size 4000x6000] [--repeat 3]
+"""
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from backend.pipeline import PIPELINE_PARAMS
+from backend.process import array_into_png, array_into_webp, create_simple_floorplan
+from benchmarks.synthetic import synthetic_floor_plan
+
+ENCODERS = {
+    "pil L z6": lambda a: array_into_png(a),
+    "pil L z1": lambda a: array_into_png(a, compress_level=1),
+    "pil 1 z6": lambda a: array_into_png(a, bilevel=True),
+    "pil 1 z1": lambda a: array_into_png(a, bilevel=True, compress_level=1),
+    "cv2 L z1": lambda a: array_into_png(a, compress_level=1, encoder="cv2"),
+    "cv2 1 z1": lambda a: array_into_png(
+        a, bilevel=True, compress_level=1, encoder="cv2"
+    ),
+    "cv2 1 z6": lambda a: array_into_png(a, bilevel=True, encoder="cv2"),
+    "webp m0": lambda a: array_into_webp(a, method=0),
+    "webp m4": lambda a: array_into_webp(a),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", default="4000x6000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split("x"))
+    plan = synthetic_floor_plan(height, width)
+    mask = create_simple_floorplan(plan, **PIPELINE_PARAMS["walls"])
+
+    print(f"{'encoder':>9} {'time [s]':>9} {'size [B]':>10}")
+    for name, encode in ENCODERS.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            encoded = encode(mask)
+            best = min(best, time.perf_counter() - start)
+        decoded = np.array(Image.open(BytesIO(encoded)).convert("L"))
+        assert np.array_equal(decoded, mask), f"{name} changes the pixels"
+        print(f"{name:>9} {best:>9.3f} {len(encoded):>10}")
+
+
+if __name__ == "__main__":
+    main()
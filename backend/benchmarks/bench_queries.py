@@ -0,0 +1,77 @@
+"""
+Count the SQL statements of the house and floor read endpoints.
+
+The endpoints load nested floors and objects with one statement per level, so
+the count must not grow with the number of rows. Every endpoint is called on a
+small and a large seeded database and the script fails if any count differs.
+
+Runs against the temporary SQLite database of benchmarks.database.
+
+Usage: python -m benchmarks.bench_queries [--houses 10] [--floors 5] [--objects 50]
+"""
+import argparse
+import sys
+import time
+
+# Before anything of backend, it points DATABASE_URL to a temporary database
+from benchmarks.database import api_client, seed
+
+from sqlalchemy import event
+
+from backend.db import async_engine
+
+statements = []
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+def endpoints(house_id, floor_id, limit):
+    """Yield the name and URL of every endpoint, names do not contain the ids."""
+    for depth in (0, 1, 2):
+        yield f"/houses?depth={depth}", f"/houses?limit={limit}&depth={depth}"
+        yield f"/houses/{{id}}?depth={depth}", f"/houses/{house_id}?depth={depth}"
+    for depth in (0, 1):
+        yield f"/floors?depth={depth}", f"/floors?limit={limit}&depth={depth}"
+        yield f"/floors/{{id}}?depth={depth}", f"/floors/{floor_id}?depth={depth}"
+
+
+def measure(client, sizes, limit):
+    house_ids, floor_ids = seed(*sizes)
+    house_id, floor_id = house_ids[0], floor_ids[0]
+    results = {}
+    for name, url in endpoints(house_id, floor_id, limit):
+        statements.clear()
+        start = time.perf_counter()
+        client.get(url).raise_for_status()
+        results[name] = (len(statements), time.perf_counter() - start)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--houses", type=int, default=10)
+    parser.add_argument("--floors", type=int, default=5)
+    parser.add_argument("--objects", type=int, default=50)
+    args = parser.parse_args()
+
+    client = api_client()
+    limit = args.houses * args.floors
+    small = measure(client, (1, 1, 1), limit)
+    large = measure(client, (args.houses, args.floors, args.objects), limit)
+
+    failed = False
+    print(f"{'endpoint':>24} {'small':>6} {'large':>6} {'time [s]':>9}")
+    for name, (count, _) in small.items():
+        large_count, seconds = large[name]
+        print(f"{name:>24} {count:>6} {large_count:>6} {seconds:>9.3f}")
+        failed |= count != large_count
+    if failed:
+        print("\nStatement count grows with the number of rows")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
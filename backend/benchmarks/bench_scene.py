@@ -0,0 +1,135 @@
+"""
+Build the scene of a furnished floor and compare it to separate downloads.
+
+A synthetic plan is converted into the floor model and --objects objects are
+placed on it with --models distinct models. The scene is fetched twice, built
+and then cached, and checked to store every model once. Runs in the temporary
+folder of benchmarks.database, next to its SQLite database.
+
+Usage: python -m benchmarks.bench_scene [--objects 500] [--models 5]
+"""
+import argparse
+import json
+import os
+import struct
+import time
+import uuid
+
+# Before anything of backend, it points DATABASE_URL to a temporary database
+from benchmarks.database import api_client, create_floor
+
+import numpy as np
+import trimesh
+from trimesh.transformations import rotation_matrix, translation_matrix
+
+from backend.numpy_to_glb import build_floor_meshes, export_glb
+from backend.pipeline import PIPELINE_PARAMS
+from backend.floor import create_simple_floor
+from backend.process import create_simple_floorplan
+from backend.routes.file import file_folder
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def glb_json(data: bytes):
+    length = struct.unpack("<I", data[12:16])[0]
+    return json.loads(data[20 : 20 + length])
+
+
+def write_floor_model():
+    plan = synthetic_floor_plan(1500, 2000)
+    walls = create_simple_floorplan(plan, **PIPELINE_PARAMS["walls"])
+    floor = create_simple_floor(plan, **PIPELINE_PARAMS["floor"])
+    layers = build_floor_meshes(
+        walls, floor_ceiling_data=floor, **PIPELINE_PARAMS["mesh"]
+    )
+    file_uuid = uuid.uuid4()
+    # The format is taken from the extension, stored files have none
+    path = os.path.join(file_folder, str(file_uuid))
+    export_glb(layers, path + ".glb")
+    os.rename(path + ".glb", path)
+    return file_uuid
+
+
+def write_models(count):
+    file_uuids = []
+    for i in range(count):
+        mesh = trimesh.creation.icosphere(subdivisions=3, radius=1 + i)
+        file_uuid = uuid.uuid4()
+        mesh.export(os.path.join(file_folder, str(file_uuid)), file_type="glb")
+        file_uuids.append(file_uuid)
+    return file_uuids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--models", type=int, default=5)
+    args = parser.parse_args()
+
+    os.makedirs(file_folder, exist_ok=True)
+    floor_model = write_floor_model()
+    models = write_models(args.models)
+
+    client = api_client()
+    floor = create_floor(client, floor_3D=str(floor_model))
+    rng = np.random.default_rng(0)
+    objects = [
+        {
+            "name": f"object {i}",
+            "x": float(x),
+            "y": 0,
+            "z": float(z),
+            "rotation": float(r),
+            "data": "",
+            "file_uuid": str(models[i % args.models]),
+        }
+        for i, (x, z, r) in enumerate(rng.uniform(0, 100, (args.objects, 3)))
+    ]
+    created = client.post(
+        "/object3ds/bulk", json={"floor_id": floor["uuid"], "objects": objects}
+    ).json()
+
+    url = f"/floors/{floor['uuid']}/scene.glb"
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        response = client.get(url)
+        response.raise_for_status()
+        timings.append(time.perf_counter() - start)
+    data = response.content
+    gltf = glb_json(data)
+    # The floor model has one mesh, every model one more
+    assert len(gltf["meshes"]) == 1 + args.models
+    revalidated = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    # An object node sits at the object's position, rotated about Y
+    placed = trimesh.load(trimesh.util.wrap_as_stream(data), file_type="glb")
+    first = created[0]
+    matrices = [
+        placed.graph[node][0]
+        for node in placed.graph.nodes_geometry
+        if node.startswith(first["file_uuid"])
+    ]
+    expected = translation_matrix([first["x"], first["y"], first["z"]])
+    expected = expected @ rotation_matrix(first["rotation"], [0, 1, 0])
+    assert any(np.allclose(matrix, expected) for matrix in matrices)
+
+    client.patch("/object3ds/bulk", json=[{"uuid": first["uuid"], "x": -1}])
+    start = time.perf_counter()
+    rebuilt = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    rebuild = time.perf_counter() - start
+    assert rebuilt.status_code == 200
+    assert len(os.listdir(os.path.join(file_folder, "scenes"))) == 1
+
+    separate = os.path.getsize(os.path.join(file_folder, str(floor_model))) + sum(
+        os.path.getsize(os.path.join(file_folder, o["file_uuid"])) for o in objects
+    )
+    print(f"{args.objects} objects, {args.models} models")
+    print(f"{'requests':>10} {1 + args.objects:>10} {1:>10}")
+    print(f"{'bytes':>10} {separate:>10} {len(data):>10}")
+    print(f"build {timings[0]:.3f}s, cached {timings[1]:.3f}s, rebuild {rebuild:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
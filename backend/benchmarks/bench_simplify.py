@@ -0,0 +1,91 @@
+"""
+Measure the contour simplification and mesh decimation stage of the GLB export.
+
+Every configuration is built from the same synthetic plan and compared with the
+unsimplified meshes. The floor area and the wall footprint (slab volume divided
+by its height) must stay within --tolerance of the reference, which must have
+both; plans too small for them fail.
+
+Usage: python -m benchmarks.bench_simplify [--size 2000x3000] [--tolerance 0.02]
+"""
+import argparse
+import time
+
+from backend.floor import create_simple_floor
+from backend.numpy_to_glb import build_floor_meshes, mesh_stats
+from backend.pipeline import PIPELINE_PARAMS
+from backend.process import create_simple_floorplan
+from benchmarks.synthetic import synthetic_floor_plan
+
+CONFIGS = {
+    "none": {},
+    "collinear": {"merge_collinear": True},
+    "dp 0.02m": {"simplify_tolerance": 0.02},
+    "dp 0.05m": {"simplify_tolerance": 0.05},
+    "dp 0.05m+decimate": {"simplify_tolerance": 0.05, "decimate_ratio": 0.6},
+}
+
+
+def footprint(layers, name, height):
+    # Extruded slabs are closed, so the volume is the footprint times height
+    return sum(mesh.volume for mesh in layers[name]) / height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", default="2000x3000")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split("x"))
+    # Thicker walls than the default, otherwise the floor layer comes out empty
+    plan = synthetic_floor_plan(height, width, rooms=(4, 6), wall_thickness=16)
+    walls = create_simple_floorplan(plan.copy(), **PIPELINE_PARAMS["walls"])
+    floor = create_simple_floor(plan.copy(), **PIPELINE_PARAMS["floor"])
+    # The reference is built without any simplification and wall union, the
+    # configurations only change the simplification keys
+    mesh_params = {
+        **PIPELINE_PARAMS["mesh"],
+        "simplify_tolerance": 0.0,
+        "merge_collinear": False,
+        "decimate_ratio": None,
+        "union_walls": False,
+    }
+    # Heights in the units of the built meshes, see build_floor_meshes
+    scale = 10 if mesh_params["scaling_method"] == "resize" else 1
+    wall_height = mesh_params["wall_height"] * scale
+    floor_height = mesh_params["floor_height"]
+
+    print(
+        f"{'config':>18} {'time [s]':>9} {'vertices':>9} {'faces':>9}"
+        f" {'floor area':>11} {'wall area':>10}"
+    )
+    reference = None
+    for config, options in CONFIGS.items():
+        start = time.perf_counter()
+        layers = build_floor_meshes(
+            walls, floor_ceiling_data=floor, **{**mesh_params, **options}
+        )
+        elapsed = time.perf_counter() - start
+
+        stats = mesh_stats(layers)
+        areas = (
+            footprint(layers, "floor", floor_height),
+            footprint(layers, "walls", wall_height),
+        )
+        if reference is None:
+            assert all(areas), "the reference has no floor or walls, try a larger plan"
+            reference = areas
+        errors = [abs(a - r) / r for a, r in zip(areas, reference)]
+        print(
+            f"{config:>18} {elapsed:>9.3f}"
+            f" {sum(s['vertices'] for s in stats.values()):>9}"
+            f" {sum(s['faces'] for s in stats.values()):>9}"
+            f" {errors[0]:>10.2%} {errors[1]:>9.2%}"
+        )
+        assert errors[0] <= args.tolerance, f"floor area drifts for {config}"
+        assert errors[1] <= args.tolerance, f"wall footprint drifts for {config}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Time the bounding box and nearest neighbour lookups of the floor index.
+
+Objects are scattered over a square floor, the lookups are checked against a
+brute force numpy scan. The endpoints are then called through the app on the
+temporary SQLite database of benchmarks.database, which also covers the index
+rebuild after a write.
+
+Usage: python -m benchmarks.bench_spatial [--objects 10000] [--queries 1000]
+"""
+import argparse
+import time
+import uuid
+
+# Before anything of backend, it points DATABASE_URL to a temporary database
+from benchmarks.database import api_client, create_floor
+
+import numpy as np
+
+from backend.schemas import Object3D
+from backend.spatial import FloorIndex
+
+FLOOR_SIZE = 100.0
+
+
+def random_objects(count, rng):
+    return [
+        Object3D(
+            uuid=uuid.uuid4(),
+            name=f"object {i}",
+            x=x,
+            y=0,
+            z=z,
+            rotation=0,
+            data="",
+            file_uuid=uuid.uuid4(),
+        )
+        for i, (x, z) in enumerate(rng.uniform(0, FLOOR_SIZE, (count, 2)))
+    ]
+
+
+def bench_index(objects, queries, rng):
+    start = time.perf_counter()
+    index = FloorIndex(objects)
+    build = time.perf_counter() - start
+    points = np.array([(o.x, o.z) for o in objects])
+
+    boxes = []
+    for min_x, min_z in rng.uniform(0, FLOOR_SIZE, (queries, 2)):
+        size = rng.uniform(1, 10)
+        boxes.append((min_x, min_z, min_x + size, min_z + size))
+    start = time.perf_counter()
+    found = [index.within(*box) for box in boxes]
+    within = (time.perf_counter() - start) / queries
+    for (min_x, min_z, max_x, max_z), result in zip(boxes, found):
+        inside = (
+            (points[:, 0] >= min_x)
+            & (points[:, 0] <= max_x)
+            & (points[:, 1] >= min_z)
+            & (points[:, 1] <= max_z)
+        )
+        assert [o.uuid for o in result] == [
+            objects[i].uuid for i in np.flatnonzero(inside)
+        ]
+
+    centers = rng.uniform(0, FLOOR_SIZE, (queries, 2))
+    start = time.perf_counter()
+    found = [index.nearest(x, z, 10) for x, z in centers]
+    nearest = (time.perf_counter() - start) / queries
+    for center, result in zip(centers, found):
+        distances = np.hypot(*(points - center).T)
+        expected = np.sort(distances)[:10]
+        assert np.allclose(
+            [np.hypot(o.x - center[0], o.z - center[1]) for o in result], expected
+        )
+
+    print(f"{len(objects)} objects, index built in {build * 1000:.1f} ms")
+    print(f"{'bbox':>8} {within * 1000:>8.3f} ms")
+    print(f"{'nearest':>8} {nearest * 1000:>8.3f} ms")
+
+
+def check_api(objects):
+    client = api_client()
+    floor = create_floor(client)
+    url = f"/floors/{floor['uuid']}/objects"
+    assert client.get(url).json() == []
+
+    created = client.post(
+        "/object3ds/bulk",
+        json={
+            "floor_id": floor["uuid"],
+            "objects": [o.model_dump(mode="json") for o in objects],
+        },
+    ).json()
+    # The write bumped the floor's generation, the empty index built above is
+    # rebuilt
+    assert len(client.get(url).json()) == len(objects)
+    start = time.perf_counter()
+    response = client.get(url, params={"bbox": "10,10,20,20"})
+    print(f"{'GET bbox':>8} {(time.perf_counter() - start) * 1000:>8.3f} ms")
+    inside = [o for o in created if 10 <= o["x"] <= 20 and 10 <= o["z"] <= 20]
+    assert {o["uuid"] for o in response.json()} == {o["uuid"] for o in inside}
+
+    moved = created[0]
+    client.patch("/object3ds/bulk", json=[{"uuid": moved["uuid"], "x": -5, "z": -5}])
+    nearest = client.get(f"{url}/nearest", params={"x": -5, "z": -5, "k": 1}).json()
+    assert nearest[0]["uuid"] == moved["uuid"]
+    assert client.get(url, params={"bbox": "1,2"}).status_code == 400
+    assert client.get(f"/floors/{uuid.uuid4()}/objects").status_code == 404
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    objects = random_objects(args.objects, rng)
+    bench_index(objects, args.queries, rng)
+    check_api(objects)
+
+
+if __name__ == "__main__":
+    main()
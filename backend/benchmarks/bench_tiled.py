@@ -0,0 +1,65 @@
+"""
+Compare whole-image and tiled thresholding and component filtering.
+
+Both wall extraction steps are run without a budget and with every given budget.
+The tiled results must be identical to the whole-image ones. The peak is the
+largest amount of memory traced during the call, on top of the input image.
+
+Usage: python -m benchmarks.bench_tiled [--size 8000x12000] [--budgets 64 256]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from backend.floor import wall_detector
+from backend.pipeline import PIPELINE_PARAMS
+from backend.process import create_simple_floorplan
+from benchmarks.synthetic import synthetic_floor_plan
+
+MIB = 1024 * 1024
+
+
+def measure(fn, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", default="8000x12000")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[64, 256])
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.size.split("x"))
+    plan = synthetic_floor_plan(height, width, rooms=(12, 16), speckles=80_000)
+    walls = PIPELINE_PARAMS["walls"]
+    steps = {
+        "walls": lambda budget: create_simple_floorplan(
+            plan, **walls, memory_budget=budget
+        ),
+        "floor": lambda budget: wall_detector(
+            plan, 190, 5, 1500, 20, memory_budget=budget
+        ),
+    }
+
+    print(f"{'step':>6} {'budget [MiB]':>13} {'time [s]':>9} {'peak [MiB]':>11}")
+    for step, run in steps.items():
+        reference = None
+        for budget in [None] + [budget * MIB for budget in args.budgets]:
+            result, elapsed, peak = measure(run, budget)
+            if reference is None:
+                reference = result
+            assert np.array_equal(result, reference), f"{step} differs at {budget}"
+            label = "-" if budget is None else budget // MIB
+            print(f"{step:>6} {label:>13} {elapsed:>9.3f} {peak / MIB:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare extruding every buffered wall polygon with extruding their union.
+
+Reports the build and export time and the wall triangle count of both modes.
+The union must not cover more than the separate polygons do, so its wall volume
+can only shrink by the overlaps that were counted twice before. The synthetic
+plan has walls thick enough for the polygons traced along them to overlap at
+every junction, there the union must remove triangles and volume. On thinner
+walls the polygons stay apart and both modes build the same meshes.
+
+Usage:
+    python -m benchmarks.bench_union [--image plan.png]
+        [--size 2000x3000] [--wall-thickness 40]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from backend.floor import create_simple_floor
+from backend.numpy_to_glb import build_floor_meshes, export_glb, mesh_stats
+from backend.pipeline import PIPELINE_PARAMS
+from backend.process import create_simple_floorplan, png_file_to_nparray
+from benchmarks.synthetic import synthetic_floor_plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image", help="PNG floor plan, synthetic if omitted")
+    parser.add_argument("--size", default="2000x3000")
+    parser.add_argument("--wall-thickness", type=int, default=40)
+    args = parser.parse_args()
+
+    if args.image:
+        plan = png_file_to_nparray(args.image)
+    else:
+        height, width = (int(v) for v in args.size.split("x"))
+        plan = synthetic_floor_plan(
+            height, width, rooms=(4, 6), wall_thickness=args.wall_thickness
+        )
+    walls = create_simple_floorplan(plan.copy(), **PIPELINE_PARAMS["walls"])
+    floor = create_simple_floor(plan.copy(), **PIPELINE_PARAMS["floor"])
+    mesh_params = dict(PIPELINE_PARAMS["mesh"], union_walls=False)
+
+    print(
+        f"{'mode':>9} {'build [s]':>10} {'export [s]':>11} {'triangles':>10}"
+        f" {'wall volume':>12} {'size [B]':>9}"
+    )
+    volumes = {}
+    triangles = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for union_walls in (False, True):
+            mode = "union" if union_walls else "separate"
+            mesh_params["union_walls"] = union_walls
+
+            start = time.perf_counter()
+            layers = build_floor_meshes(walls, floor_ceiling_data=floor, **mesh_params)
+            build_time = time.perf_counter() - start
+
+            filename = os.path.join(tmp, f"{mode}.glb")
+            start = time.perf_counter()
+            export_glb(layers, filename)
+            export_time = time.perf_counter() - start
+
+            volumes[mode] = sum(mesh.volume for mesh in layers["walls"])
+            triangles[mode] = mesh_stats(layers)["walls"]["faces"]
+            print(
+                f"{mode:>9} {build_time:>10.3f} {export_time:>11.3f}"
+                f" {triangles[mode]:>10}"
+                f" {volumes[mode]:>12.1f} {os.path.getsize(filename):>9}"
+            )
+
+    print(
+        f"{'removed':>9} {'':>10} {'':>11}"
+        f" {triangles['separate'] - triangles['union']:>10}"
+        f" {volumes['separate'] - volumes['union']:>12.1f}"
+    )
+    assert volumes["union"] <= volumes["separate"] * (1 + 1e-6), "union grew"
+    if not args.image:
+        assert triangles["union"] < triangles["separate"], "no overlap removed"
+        assert volumes["union"] < volumes["separate"], "no overlap removed"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Temporary database of the benchmarks that go through the app or its tables.
+
+Import this module before anything of backend, which creates its engines from
+DATABASE_URL when it is first imported. The database is kept in a temporary
+folder, which also becomes the working directory, so the files the app writes
+end up next to it.
+"""
+import os
+import tempfile
+import uuid
+
+folder = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{folder}/bench.db"
+os.chdir(folder)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete, insert  # noqa: E402
+
+from backend import models  # noqa: E402
+from backend.db import SessionLocal  # noqa: E402
+from backend.main import app  # noqa: E402
+
+SEED_CHUNK = 50_000
+
+
+def api_client():
+    return TestClient(app)
+
+
+def check(response):
+    response.raise_for_status()
+    return response.json()
+
+
+def create_floor(client, **fields):
+    """Create a house with one floor through the API and return the floor."""
+    house = check(
+        client.post(
+            "/houses",
+            json={
+                "name": "bench",
+                "image": "",
+                "description": "",
+                "address": "",
+                "longitude": 0,
+                "latitude": 0,
+            },
+        )
+    )
+    floor = {
+        "name": "bench",
+        "height": 25,
+        "index": 0,
+        "house_id": house["uuid"],
+        "floor_3D": None,
+        "floor_3D_walls": None,
+        "floor_png": None,
+    }
+    return check(client.post("/floor", json={**floor, **fields}))
+
+
+def new_uuid():
+    # UUID columns have numeric affinity in SQLite, a hex that reads as a
+    # number, like 1234e567..., would be stored as one
+    while True:
+        value = uuid.uuid4()
+        try:
+            float(value.hex)
+        except ValueError:
+            return value
+
+
+def seed(houses, floors, objects):
+    """
+    Replace the houses, floors and objects with houses that have floors floors
+    of objects objects each, inserted in chunks of SEED_CHUNK rows.
+
+    Returns the UUIDs of the houses and of the floors.
+    """
+    house_ids = [new_uuid() for _ in range(houses)]
+    floor_rows = [
+        {"uuid": new_uuid(), "name": f"floor {f}", "index": f, "house_id": house_id}
+        for house_id in house_ids
+        for f in range(floors)
+    ]
+    object_rows = (
+        {
+            "uuid": new_uuid(),
+            "name": f"object {o}",
+            "floor_id": floor["uuid"],
+            "x": o,
+            "y": 0,
+            "z": o,
+            "rotation": 0,
+            "data": "",
+            "file_uuid": floor["uuid"],
+        }
+        for floor in floor_rows
+        for o in range(objects)
+    )
+    with SessionLocal() as db:
+        for table in (models.Object3D, models.Floor, models.House):
+            db.execute(delete(table))
+        db.execute(
+            insert(models.House),
+            [
+                {
+                    "uuid": house_id,
+                    "name": f"house {h}",
+                    "image": "",
+                    "description": "",
+                    "address": "",
+                    "longitude": 0,
+                    "latitude": 0,
+                }
+                for h, house_id in enumerate(house_ids)
+            ],
+        )
+        db.execute(insert(models.Floor), floor_rows)
+        while chunk := [row for _, row in zip(range(SEED_CHUNK), object_rows)]:
+            db.execute(insert(models.Object3D), chunk)
+        db.commit()
+    return house_ids, [floor["uuid"] for floor in floor_rows]
@@ -0,0 +1,278 @@
+"""
+Benchmark suite for the floor plan to GLB pipeline.
+
+Every case is a synthetic floor plan of a given size and wall density. For each
+stage the best wall time of --repeat runs and the peak traced memory of one
+extra run are recorded, together with the contour and triangle counts of the
+generated meshes. The convert stage runs the whole conversion of a job, levels
+of detail included, and counts the artifacts it wrote; the blank case has no
+geometry at all and must still convert. A PDF given with --pdf adds the rasterization stage and, with
+--processor, the experimental FloorPlanProcessor; both need poppler.
+
+Results can be saved as a JSON baseline and later runs compared against it.
+A fixed numpy and OpenCV reference kernel is timed before every case, and stage
+times are compared relative to its median, so a baseline recorded on one machine
+holds on another one roughly as much faster or slower in both.
+A stage is reported as a regression when its relative time or its memory is
+more than --threshold times the baseline's; stages under MIN_TIME seconds in
+both runs are too noisy for their time to count. Changed contour or triangle
+counts are reported as well, since they mean the vision code produces
+different output.
+
+Baselines are kept in benchmarks/baselines. The committed "main" baseline holds
+the results of the main branch. Regenerate it with --save main after a change
+that is meant to change the results.
+
+Usage:
+    python -m benchmarks.run --save main
+    python -m benchmarks.run --compare main [--threshold 1.5]
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from backend.floor import create_simple_floor
+from backend.numpy_to_glb import build_floor_meshes, export_glb, mesh_stats
+from backend.pipeline import LOD_LEVELS, PIPELINE_PARAMS, convert_image
+from backend.process import create_simple_floorplan, pdf_file_to_nparray
+from benchmarks.synthetic import synthetic_floor_plan
+
+BASELINE_FOLDER = os.path.join(os.path.dirname(__file__), "baselines")
+
+# (name, (height, width), rooms along (rows, cols), wall thickness). Walls of
+# small plans are thicker, otherwise they vanish when the mesh step resizes them.
+# A case without rooms is a blank page.
+CASES = [
+    ("small-sparse", (1500, 2000), (3, 4), 20),
+    ("small-dense", (1500, 2000), (6, 8), 20),
+    ("medium-sparse", (3000, 4000), (4, 6), 16),
+    ("medium-dense", (3000, 4000), (8, 12), 16),
+    ("large-dense", (4000, 6000), (12, 16), 12),
+    ("blank", (1500, 2000), None, 0),
+]
+
+MIB = 1024 * 1024
+
+# Stages faster than this, in seconds, are not flagged for their time
+MIN_TIME = 0.05
+
+
+def measure(fn, repeat):
+    """Best wall time of repeat calls and the traced peak of one more call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"time": best, "peak": peak}
+
+
+def reference_kernel():
+    """
+    Fixed workload the stage times are compared relative to.
+
+    Only numpy and OpenCV, like the vision code, and nothing of the backend, so
+    that changes to the pipeline do not change it.
+    """
+    image = np.random.default_rng(0).integers(0, 256, (2000, 2000), np.uint8)
+    blurred = cv2.blur(image, (9, 9))
+    _, mask = cv2.threshold(blurred, 127, 255, cv2.THRESH_BINARY)
+    cv2.connectedComponentsWithStats(mask)
+    np.sort(blurred, axis=None)
+
+
+def run_pipeline(plan, repeat, folder):
+    stages = {}
+    walls, stages["walls"] = measure(
+        lambda: create_simple_floorplan(plan, **PIPELINE_PARAMS["walls"]), repeat
+    )
+    floor, stages["floor"] = measure(
+        lambda: create_simple_floor(plan, **PIPELINE_PARAMS["floor"]), repeat
+    )
+    layers, stages["mesh"] = measure(
+        lambda: build_floor_meshes(
+            walls, floor_ceiling_data=floor, **PIPELINE_PARAMS["mesh"]
+        ),
+        repeat,
+    )
+    filename = os.path.join(folder, "floor.glb")
+    if os.path.exists(filename):
+        os.remove(filename)
+    _, stages["export"] = measure(lambda: export_glb(layers, filename), repeat)
+
+    # Nothing is exported when no contour survived the filters
+    counts = {
+        "glb_bytes": os.path.getsize(filename) if os.path.exists(filename) else 0
+    }
+    for name, stats in mesh_stats(layers).items():
+        # Every traced contour is extruded into a mesh of its own
+        counts[f"{name}_contours"] = len(layers[name])
+        counts[f"{name}_triangles"] = stats["faces"]
+
+    # The whole job with every level of detail, each run writes its artifacts
+    # to a folder of its own
+    params = {**PIPELINE_PARAMS, "lods": LOD_LEVELS}
+
+    def convert():
+        return convert_image(plan, tempfile.mkdtemp(dir=folder), params)
+
+    result, stages["convert"] = measure(convert, repeat)
+    counts["artifacts"] = sum(
+        file_uuid is not None for name, file_uuid in result.items() if name != "lods"
+    )
+    counts["lod_artifacts"] = sum(len(levels) for levels in result["lods"].values())
+    return stages, counts
+
+
+def run_processor(pdf, repeat, folder):
+    # Imported lazily, the module configures logging and a joblib cache folder
+    # relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        from detect_edges import FloorPlanProcessor
+
+        processor = FloorPlanProcessor(pdf, min_component_size=5000, cell_size=100)
+        _, stage = measure(processor.process, repeat)
+    finally:
+        os.chdir(cwd)
+    return stage
+
+
+def run(args):
+    # The kernel is timed before every case, the median of its times follows
+    # the speed of the machine over the whole run
+    references = []
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for name, (height, width), rooms, wall_thickness in CASES:
+            if args.cases and name not in args.cases:
+                continue
+            references.append(measure(reference_kernel, args.repeat)[1]["time"])
+            if rooms is None:
+                plan = np.full((height, width), 255, np.uint8)
+            else:
+                plan = synthetic_floor_plan(
+                    height, width, rooms=rooms, wall_thickness=wall_thickness
+                )
+            stages, counts = run_pipeline(plan, args.repeat, folder)
+            results[name] = {"stages": stages, "counts": counts}
+
+        if args.pdf:
+            references.append(measure(reference_kernel, args.repeat)[1]["time"])
+            plan, rasterize = measure(
+                lambda: pdf_file_to_nparray(args.pdf), args.repeat
+            )
+            stages, counts = run_pipeline(plan, args.repeat, folder)
+            stages = {"rasterize": rasterize, **stages}
+            if args.processor:
+                stages["processor"] = run_processor(
+                    os.path.abspath(args.pdf), args.repeat, folder
+                )
+            results["pdf"] = {"stages": stages, "counts": counts}
+    return {"reference": statistics.median(references), "cases": results}
+
+
+def report(results, baseline, threshold):
+    regressions = []
+    print(f"reference kernel: {results['reference']:.3f} s")
+    if baseline:
+        # How much slower this machine is than the baseline's
+        speed = results["reference"] / baseline["reference"]
+        print(f"baseline kernel:  {baseline['reference']:.3f} s ({speed:.2f}x)")
+    print(
+        f"{'case':>14} {'stage':>10} {'time [s]':>9} {'peak [MiB]':>11}"
+        f" {'vs baseline':>12}"
+    )
+    for case, result in results["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        for stage, values in result["stages"].items():
+            change = ""
+            if base and stage in base["stages"]:
+                before = base["stages"][stage]
+                expected = before["time"] * speed
+                ratios = [
+                    values["time"] / max(expected, 1e-9),
+                    values["peak"] / max(before["peak"], 1),
+                ]
+                change = f"{ratios[0]:>5.2f}x {ratios[1]:>4.2f}x"
+                if max(values["time"], expected) < MIN_TIME:
+                    ratios[0] = 1.0
+                if max(ratios) > threshold:
+                    regressions.append(f"{case} {stage}: {change}")
+            print(
+                f"{case:>14} {stage:>10} {values['time']:>9.3f}"
+                f" {values['peak'] / MIB:>11.1f} {change:>12}"
+            )
+        counts = " ".join(f"{key}={value}" for key, value in result["counts"].items())
+        print(f"{case:>14} {'counts':>10} {counts}")
+        if base and base["counts"] != result["counts"]:
+            regressions.append(f"{case} counts changed: {base['counts']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=[case[0] for case in CASES],
+        help="Subset of the cases",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pdf", help="PDF floor plan to benchmark as well")
+    parser.add_argument("--processor", action="store_true")
+    parser.add_argument("--save", metavar="NAME", help="Save results as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="Baseline to compare to")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        path = os.path.join(BASELINE_FOLDER, f"{args.compare}.json")
+        if not os.path.exists(path):
+            saved = sorted(
+                os.path.basename(name)[: -len(".json")]
+                for name in glob.glob(os.path.join(BASELINE_FOLDER, "*.json"))
+            )
+            parser.error(
+                f"no baseline {args.compare!r} in {BASELINE_FOLDER}, save one with"
+                f" --save {args.compare} (saved: {', '.join(saved) or 'none'})"
+            )
+        with open(path) as f:
+            baseline = json.load(f)
+        if "reference" not in baseline:
+            parser.error(
+                f"baseline {args.compare!r} has no reference kernel time, save it"
+                f" again with --save {args.compare}"
+            )
+
+    results = run(args)
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        os.makedirs(BASELINE_FOLDER, exist_ok=True)
+        with open(os.path.join(BASELINE_FOLDER, f"{args.save}.json"), "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    if regressions:
+        print("\nRegressions:\n" + "\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
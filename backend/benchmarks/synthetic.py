@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def synthetic_floor_plan(
+    height=4000,
+    width=6000,
+    rooms=(6, 8),
+    wall_thickness=12,
+    speckles=20_000,
+    dimension_lines=200,
+    seed=0,
+):
+    """
+    Generate a grayscale floor plan that looks like a scanned drawing.
+
+    The plan has a grid of rooms separated by thick walls with door gaps, thin
+    dimension lines and many small speckles such as text and scan noise.
+
+    Parameters:
+        height (int): Image height in pixels.
+        width (int): Image width in pixels.
+        rooms (tuple): Number of rooms along (rows, cols), controls wall density.
+        wall_thickness (int): Thickness of the walls in pixels.
+        speckles (int): Number of small blobs scattered over the plan.
+        dimension_lines (int): Number of thin dimension lines.
+        seed (int): Random seed.
+
+    Returns:
+        np.ndarray: uint8 image, 255 background and dark lines.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width), 255, dtype=np.uint8)
+    margin = max(height, width) // 40
+
+    # Walls, each room wall gets a door gap
+    ys = np.linspace(margin, height - margin - wall_thickness, rooms[0] + 1).astype(int)
+    xs = np.linspace(margin, width - margin - wall_thickness, rooms[1] + 1).astype(int)
+    for y in ys:
+        img[y : y + wall_thickness, xs[0] : xs[-1] + wall_thickness] = 0
+    for x in xs:
+        img[ys[0] : ys[-1] + wall_thickness, x : x + wall_thickness] = 0
+    door = 6 * wall_thickness
+    for y0, y1 in zip(ys[:-1], ys[1:]):
+        for x in xs[1:-1]:
+            low = y0 + wall_thickness
+            gap = rng.integers(low, max(y1 - door, low + 1))
+            img[gap : gap + door, x : x + wall_thickness] = 255
+    for x0, x1 in zip(xs[:-1], xs[1:]):
+        for y in ys[1:-1]:
+            low = x0 + wall_thickness
+            gap = rng.integers(low, max(x1 - door, low + 1))
+            img[y : y + wall_thickness, gap : gap + door] = 255
+
+    # Thin dimension lines, thick enough to survive the averaging filter
+    for _ in range(dimension_lines):
+        if rng.random() < 0.5:
+            y = rng.integers(0, height - 4)
+            x0 = rng.integers(0, width // 2)
+            img[y : y + 4, x0 : x0 + rng.integers(50, width // 2)] = 40
+        else:
+            x = rng.integers(0, width - 4)
+            y0 = rng.integers(0, height // 2)
+            img[y0 : y0 + rng.integers(50, height // 2), x : x + 4] = 40
+
+    # Text glyphs and scan speckles, small blobs of a few to a dozen pixels
+    sy = rng.integers(0, height - 12, speckles)
+    sx = rng.integers(0, width - 12, speckles)
+    size = rng.integers(5, 13, speckles)
+    for dy in range(12):
+        for dx in range(12):
+            mask = (dy < size) & (dx < size)
+            img[sy[mask] + dy, sx[mask] + dx] = rng.integers(0, 120)
+
+    return img
@@ -0,0 +1,33 @@
+"""add floor objects generation
+
+Revision ID: 5be0f3a91c27
+Revises: d41c7e2b8a90
+Create Date: 2026-10-18 14:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5be0f3a91c27"
+down_revision: Union[str, None] = "d41c7e2b8a90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # main.py's create_all may have added the column already
+    inspector = sa.inspect(op.get_bind())
+    if "objects_generation" not in {c["name"] for c in inspector.get_columns("floor")}:
+        op.add_column(
+            "floor",
+            sa.Column(
+                "objects_generation", sa.Integer(), nullable=False, server_default="0"
+            ),
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("floor", "objects_generation")
@@ -0,0 +1,37 @@
+"""add foreign key indexes
+
+Revision ID: 67b3c9366969
+Revises:
+Create Date: 2026-10-18 12:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "67b3c9366969"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created by create_all after this change have them already
+    op.create_index(
+        "ix_floor_house_id", "floor", ["house_id"], unique=False, if_not_exists=True
+    )
+    op.create_index(
+        "ix_objects3D_floor_id",
+        "objects3D",
+        ["floor_id"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_objects3D_floor_id", table_name="objects3D")
+    op.drop_index("ix_floor_house_id", table_name="floor")
@@ -0,0 +1,30 @@
+"""add levels of detail
+
+Revision ID: 9566c6bf08ed
+Revises: 67b3c9366969
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9566c6bf08ed"
+down_revision: Union[str, None] = "67b3c9366969"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # main.py's create_all may have added the columns already
+    inspector = sa.inspect(op.get_bind())
+    for table, column in (("floor", "floor_3D_lods"), ("uploaded_file", "lods")):
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column(column, sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("uploaded_file", "lods")
+    op.drop_column("floor", "floor_3D_lods")
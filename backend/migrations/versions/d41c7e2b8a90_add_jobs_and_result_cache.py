@@ -0,0 +1,64 @@
+"""add jobs and result cache
+
+Revision ID: d41c7e2b8a90
+Revises: 9566c6bf08ed
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "d41c7e2b8a90"
+down_revision: Union[str, None] = "9566c6bf08ed"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # main.py's create_all may have added the tables already, those of
+    # databases created before the job metrics lack the metrics column
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if "job" not in tables:
+        op.create_table(
+            "job",
+            sa.Column("uuid", postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("content_type", sa.String(), nullable=True),
+            sa.Column("cache_key", sa.String(), nullable=True),
+            sa.Column("result", sa.JSON(), nullable=True),
+            sa.Column("error", sa.String(), nullable=True),
+            sa.Column("metrics", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("uuid"),
+        )
+    elif "metrics" not in {c["name"] for c in inspector.get_columns("job")}:
+        op.add_column("job", sa.Column("metrics", sa.JSON(), nullable=True))
+    if "result_cache" not in tables:
+        op.create_table(
+            "result_cache",
+            sa.Column("key", sa.String(), nullable=False),
+            sa.Column("result", sa.JSON(), nullable=True),
+            sa.Column("size", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("key"),
+        )
+    op.create_index(
+        "ix_result_cache_last_used_at",
+        "result_cache",
+        ["last_used_at"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_result_cache_last_used_at", table_name="result_cache")
+    op.drop_table("result_cache")
+    op.drop_table("job")
@@ -6,6 +6,21 @@ export type FileResponse = {
   floor_3D_walls: string
 }
 
+export type Job = {
+  uuid: string
+  status: 'queued' | 'running' | 'done' | 'failed'
+  result: FileResponse | null
+  error: string | null
+}
+
+export const getJob = async (jobId: string): Promise<Job> => {
+  const res = await fetch(`${baseUrl}/jobs/${jobId}`)
+  if (!res.ok) {
+    throw new Error('Failed to fetch job')
+  }
+  return res.json()
+}
+
 export const uploadPng = async (file: Blob): Promise<FileResponse> => {
   const formData = new FormData()
   formData.append('in_file', file)
@@ -16,7 +31,18 @@ export const uploadPng = async (file: Blob): Promise<FileResponse> => {
   if (!res.ok) {
     throw new Error('Failed to upload PNG')
   }
-  return res.json()
+  const { job_id } = await res.json()
+
+  while (true) {
+    const job = await getJob(job_id)
+    if (job.status === 'done' && job.result) {
+      return job.result
+    }
+    if (job.status === 'failed') {
+      throw new Error(`Failed to convert PNG: ${job.error}`)
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000))
+  }
 }
 
 export const upload3DModel = async (file: Blob): Promise<string> => {